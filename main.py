@@ -1,55 +1,127 @@
+import argparse
 from src.utils import print_with_timestamp
-from src.config_loader import load_config, get_config
-from src.arxiv_client import get_random_paper
-from src.gemini_processor import process_paper_with_gemini
-from src.chatgpt_processor import process_paper_with_chatgpt
-from src.paper_formatter import format_paper_for_slack
-from src.slack_sender import send_to_slack, add_greeting_to_message
+from src.config_loader import load_config, get_profiles
+from src.deadline import start_deadline, release_reserve, remaining_seconds
+from src.metrics import set_metric, report_metrics
+from src.slack_sender import send_to_slack, SEND_OK, SEND_FAILED, SEND_SKIPPED
+from src import outbox
+
+def build_messages(config):
+    """論文の取得・LLM処理・フォーマットを行い、(プロファイル, 論文, メッセージ) のリストを返す"""
+    # LLMやarXivのライブラリの読み込みは時間がかかるため、必要なコマンドでのみ読み込む
+    from src.pipeline import build_messages_for_profiles
+
+    # 実行全体の締め切りを設定（各処理は残り時間をタイムアウトとして使う）
+    runtime_config = config.get('runtime', {})
+    start_deadline(runtime_config.get('deadline_seconds'), runtime_config.get('slack_reserve_seconds', 30))
+
+    profiles = get_profiles()
+    print_with_timestamp(f"プロファイル: {', '.join(profile['name'] for profile in profiles)}")
+
+    # 論文の取得・LLM処理・フォーマット（全プロファイル分をまとめて処理）
+    return build_messages_for_profiles(profiles)
+
+def run(config, args):
+    """論文の取得からSlack送信までを一度に行う"""
+    messages = build_messages(config)
+    if not messages:
+        print_with_timestamp("送信できるメッセージがありません。処理を終了します。")
+        return
+
+    # Slack送信（確保しておいた時間をここで使う）
+    release_reserve()
+    for profile, _, message in messages:
+        print_with_timestamp(f"プロファイル {profile['name']} のメッセージを送信します")
+        result = send_to_slack(message, slack_config=profile['slack'])
+
+        if result == SEND_OK:
+            print_with_timestamp(f"プロファイル {profile['name']} の処理が正常に完了しました。")
+        else:
+            print_with_timestamp(f"プロファイル {profile['name']} のSlackへの送信が失敗しましたが、処理は継続されました。")
+
+def prepare(config, args):
+    """送信用のメッセージを事前に作成し、送信待ちキューに保存する"""
+    messages = build_messages(config)
+    if not messages:
+        print_with_timestamp("保存できるメッセージがありません。処理を終了します。")
+        return
+
+    for profile, paper, message in messages:
+        priority = args.priority if args.priority is not None else profile['outbox'].get('priority', 0)
+        ttl_hours = args.ttl_hours if args.ttl_hours is not None else profile['outbox'].get('ttl_hours')
+        if outbox.enqueue(profile['name'], paper.entry_id, message, priority=priority, ttl_hours=ttl_hours):
+            print_with_timestamp(f"プロファイル {profile['name']} のメッセージを送信待ちキューに保存しました")
+        else:
+            print_with_timestamp(f"プロファイル {profile['name']} の論文は既に送信待ちキューにあるため保存しません")
+
+    set_metric('outbox_pending', outbox.count_pending())
+
+def send(config, args):
+    """送信待ちキューからメッセージを取り出してSlackに送信する（LLMやarXivには依存しない）"""
+    expired, abandoned = outbox.expire_messages()
+    if expired:
+        print_with_timestamp(f"有効期限切れのメッセージ {expired} 件を破棄しました")
+    if abandoned:
+        print_with_timestamp(f"送信されたか不明なまま期限を過ぎたメッセージ {abandoned} 件を送信結果不明として確定しました")
+
+    for profile in get_profiles():
+        stuck = outbox.count_stuck_messages(profile['name'])
+        if stuck:
+            print_with_timestamp(f"プロファイル {profile['name']} に送信済みか不明なメッセージが {stuck} 件あります（二重投稿を避けるため再送しません）")
+
+        for _ in range(args.limit):
+            claimed = outbox.claim_next(profile['name'])
+            if claimed is None:
+                print_with_timestamp(f"プロファイル {profile['name']} の送信待ちメッセージはありません")
+                break
+
+            message_id, message = claimed
+            result = send_to_slack(message, slack_config=profile['slack'])
+            if result == SEND_OK:
+                outbox.mark_sent(message_id)
+                print_with_timestamp(f"プロファイル {profile['name']} のメッセージを送信しました")
+            elif result in (SEND_FAILED, SEND_SKIPPED):
+                # 送信されていないことが確実なメッセージは次回の送信に回す
+                outbox.release(message_id)
+                print_with_timestamp(f"プロファイル {profile['name']} のメッセージを送信できなかったため、送信待ちに戻しました")
+                break
+            else:
+                # タイムアウトや5xxではSlack側で投稿済みの可能性があるため、二重投稿を避けて送信中のまま残す
+                print_with_timestamp(f"プロファイル {profile['name']} のメッセージが送信されたか不明なため、再送せずに残します")
+                break
+
+    outbox.prune_messages()
+    set_metric('outbox_pending', outbox.count_pending())
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="arXivの論文をSlackに投稿する")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", help="論文の取得から送信までを一度に行う（既定）")
+
+    prepare_parser = subparsers.add_parser("prepare", help="送信用のメッセージを作成して送信待ちキューに保存する")
+    prepare_parser.add_argument("--priority", type=int, help="優先度（大きいほど先に送信される）")
+    prepare_parser.add_argument("--ttl-hours", type=float, help="有効期限（時間）")
+
+    send_parser = subparsers.add_parser("send", help="送信待ちキューのメッセージを送信する")
+    send_parser.add_argument("--limit", type=int, default=1, help="プロファイルごとに送信する最大件数")
+    return parser.parse_args()
 
 def main():
     """メイン処理関数"""
+    args = parse_args()
+    commands = {"run": run, "prepare": prepare, "send": send}
     try:
-        load_config()
+        config = load_config()
         print_with_timestamp("ArXiv to Slack 処理を開始します")
-        
-        # 論文の取得
-        paper = get_random_paper()
-        if not paper:
-            print_with_timestamp("論文の取得に失敗しました。処理を終了します。")
-            return
-        
-        config = get_config()
-        llm_provider = config.get('llm', {}).get('provider', 'none')
-        
-        print_with_timestamp(f"使用するLLMプロバイダ: {llm_provider}")
-        print_with_timestamp(f"取得した論文: {paper.title}")
-        
-        # LLM処理
-        if llm_provider == "gemini":
-            paper = process_paper_with_gemini(paper)
-        elif llm_provider == "chatgpt":
-            paper = process_paper_with_chatgpt(paper)
-        else:
-            print_with_timestamp("LLMは使用しません")
-        
-        # メッセージのフォーマット
-        message = format_paper_for_slack(paper)
-        if not message:
-            print_with_timestamp("メッセージのフォーマットに失敗しました。処理を終了します。")
-            return
-        
-        # あいさつの追加とSlack送信
-        message = add_greeting_to_message(message)
-        result = send_to_slack(message)
-        
-        if result:
-            print_with_timestamp("処理が正常に完了しました。")
-        else:
-            print_with_timestamp("Slackへの送信が失敗しましたが、処理は継続されました。")
-            
+        commands[args.command or "run"](config, args)
+
     except Exception as e:
         print_with_timestamp(f"メイン処理中に予期しないエラーが発生しました: {e}")
         print_with_timestamp("処理を終了します。")
+    finally:
+        remaining = remaining_seconds()
+        set_metric('remaining_seconds', round(remaining, 1) if remaining is not None else None)
+        report_metrics()
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,28 @@
 """
 arXivからの論文検索と取得を行うモジュール
 """
-import arxiv
 from datetime import datetime
-import random
+from xml.etree import ElementTree
 import time
 from .config_loader import get_config
 from .utils import print_with_timestamp
+from .deadline import stage_timeout, is_expired
+from .paper_record import PaperRecord
+from .selection import ReservoirSampler, TopKSelector
+from .http_client import CircuitOpenError
+from . import http_client
+
+# arXivの検索APIのホスト名とURL（ホストごとの同時実行数の上限・サーキットブレーカー・メトリクスに使う）
+ARXIV_HOST = "export.arxiv.org"
+ARXIV_API_URL = f"https://{ARXIV_HOST}/api/query"
+# 検索結果の取得にかける時間の上限（秒）の既定値（設定の arxiv.search_timeout_seconds で変更できる）
+DEFAULT_SEARCH_TIMEOUT = 120
+# 1ページ分のリクエストのタイムアウト（秒）とページ取得の間隔（秒）
+PAGE_TIMEOUT = 30
+PAGE_INTERVAL = 0.5
+
+# 検索APIが返すAtomフィードの名前空間
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
 
 def is_recent_paper(paper, max_years_old):
     try:
@@ -24,123 +40,223 @@ def contains_keywords(paper, keywords):
     title_and_summary = (paper.title + " " + paper.summary).lower()
     return any(keyword.lower() in title_and_summary for keyword in keywords)
 
-def filter_papers(papers, max_years_old, keywords):
-    original_count = len(papers)
-    print_with_timestamp(f"論文フィルタリングを開始します（{original_count}件）")
+def build_query(categories, keywords):
+    """カテゴリとキーワードからArXivの検索クエリを構築する"""
+    category_query = " OR ".join(f"cat:{cat}" for cat in categories)
+    if keywords:
+        keyword_query = " OR ".join(f'"{keyword}"' for keyword in keywords)
+        return f"({category_query}) AND ({keyword_query})"
+    return f"({category_query})"
+
+def parse_entry(entry):
+    """Atomフィードのentry要素を論文レコードに変換する"""
+    def text(tag):
+        return (entry.findtext(f"{ATOM_NS}{tag}") or "").strip()
+
+    pdf_url = None
+    for link in entry.findall(f"{ATOM_NS}link"):
+        if link.get("title") == "pdf":
+            pdf_url = link.get("href")
+    try:
+        published = datetime.strptime(text("published"), "%Y-%m-%dT%H:%M:%SZ")
+    except ValueError:
+        published = None
+
+    return PaperRecord(
+        entry_id=text("id"),
+        title=text("title"),
+        summary=text("summary"),
+        authors=tuple(author.findtext(f"{ATOM_NS}name", "").strip() for author in entry.findall(f"{ATOM_NS}author")),
+        published=published,
+        categories=tuple(category.get("term") for category in entry.findall(f"{ATOM_NS}category")),
+        pdf_url=pdf_url,
+    )
+
+def parse_feed(content):
+    """検索APIの応答（Atomフィード）を論文レコードのリストに変換する"""
+    papers = []
+    for entry in ElementTree.fromstring(content).findall(f"{ATOM_NS}entry"):
+        paper = parse_entry(entry)
+        # クエリが不正な場合はエラー内容を1件のentryとして返す
+        if "/api/errors" in paper.entry_id:
+            raise ValueError(f"ArXiv APIがエラーを返しました: {paper.summary}")
+        papers.append(paper)
+    return papers
+
+def fetch_page(query, start, page_size):
+    """
+    検索結果の1ページ分を取得する
+
+    http_client を経由するため、共通のリトライ・同時実行数の上限・
+    サーキットブレーカー・メトリクスが適用される。
+    """
+    response = http_client.get(
+        ARXIV_API_URL,
+        params={
+            "search_query": query,
+            "start": start,
+            "max_results": page_size,
+            "sortBy": "submittedDate",
+            "sortOrder": "descending",
+        },
+        timeout=PAGE_TIMEOUT
+    )
+    response.raise_for_status()
+    return parse_feed(response.content)
+
+def iter_results_with_retry(query, max_results, page_size=10, timeout=DEFAULT_SEARCH_TIMEOUT):
+    """
+    ArXivの検索結果を論文レコードとして1件ずつ返すジェネレータ
+
+    結果はページ単位で必要になった時点で取得するため、呼び出し側が反復を
+    やめればそれ以降のページは取得しない。リトライは http_client の共通ポリシーに従う。
+    検索はtimeout秒か締め切りまでの残り時間の短い方で打ち切る。
+    """
+    print_with_timestamp(f"検索クエリ: {query}")
+    end_time = time.monotonic() + stage_timeout(timeout)
+    yielded = 0
+    while yielded < max_results:
+        if is_expired() or time.monotonic() > end_time:
+            print_with_timestamp(f"タイムアウト: {yielded}件の論文を取得済み")
+            break
+        if yielded:
+            time.sleep(PAGE_INTERVAL)
+
+        try:
+            papers = fetch_page(query, yielded, min(page_size, max_results - yielded))
+        except CircuitOpenError as e:
+            print_with_timestamp(f"論文検索を中止します: {e}")
+            break
+        except Exception as e:
+            print_with_timestamp(f"論文検索中にエラーが発生しました: {e}")
+            break
+
+        if not papers:
+            if not yielded:
+                print_with_timestamp("検索結果が空でした")
+            break
+        for paper in papers:
+            yielded += 1
+            yield paper
+
+    print_with_timestamp(f"ArXivから {yielded} 件の論文を取得しました")
+
+def search_ai_papers_with_retry():
+    """
+    リトライ機能付きのArXiv検索（トップレベルのarxiv設定を使用）
+
+    検索結果をページ単位で取得しながら条件を判定し、一致した論文が
+    candidate_target 件に達した時点で検索を打ち切って返す。
+    """
+    arxiv_settings = get_config()['arxiv']
+    keywords = arxiv_settings.get('filters', {}).get('keywords', [])
+    target = arxiv_settings.get('candidate_target', 20)
     
-    filtered_papers = [
-        paper for paper in papers 
-        if is_recent_paper(paper, max_years_old) and (not keywords or contains_keywords(paper, keywords))
-    ]
+    print_with_timestamp("ArXivからAI関連の論文の検索を開始します")
+    query = build_query(arxiv_settings['categories'], keywords[:3])
     
-    return filtered_papers
-
-def search_ai_papers_with_retry(max_retries=3, delay=2):
-    """リトライ機能付きのArXiv検索（高速化版）"""
-    config = get_config()
+    papers = []
+    results = iter_results_with_retry(
+        query, arxiv_settings.get('max_results', 50), arxiv_settings.get('page_size', 10),
+        timeout=arxiv_settings.get('search_timeout_seconds', DEFAULT_SEARCH_TIMEOUT)
+    )
+    for result in results:
+        if matches_profile(result, arxiv_settings):
+            papers.append(result)
+            if len(papers) >= target:
+                results.close()
+                break
     
-    # 設定から検索条件を取得
-    ai_categories = config['arxiv']['categories']
-    max_results = min(config['arxiv']['max_results'], 50)  # 結果数を制限して高速化
-    filters = config['arxiv'].get('filters', {})
-    max_years_old = filters.get('max_years_old', 3)
+    print_with_timestamp(f"条件に一致した論文: {len(papers)} 件")
+    return papers
+
+def matches_profile(paper, arxiv_settings):
+    """論文がプロファイルのカテゴリ・公開日・キーワード条件を満たすか判定する"""
+    categories = arxiv_settings.get('categories', [])
+    filters = arxiv_settings.get('filters', {})
     keywords = filters.get('keywords', [])
     
-    print_with_timestamp("ArXivからAI関連の論文の検索を開始します（高速化モード）")
+    if categories and not set(categories) & set(paper.categories or []):
+        return False
+    if not is_recent_paper(paper, filters.get('max_years_old', 3)):
+        return False
+    return not keywords or contains_keywords(paper, keywords)
+
+def count_keyword_hits(paper, keywords):
+    """タイトルとアブストラクトに含まれるキーワードの種類数を返す"""
+    title_and_summary = (paper.title + " " + paper.summary).lower()
+    return sum(1 for keyword in keywords if keyword.lower() in title_and_summary)
+
+def create_selector(arxiv_settings):
+    """プロファイルの選択方式に応じた選択器を作成する"""
+    selection = arxiv_settings.get('selection', 'random')
+    if selection == 'keyword_score':
+        keywords = arxiv_settings.get('filters', {}).get('keywords', [])
+        return TopKSelector(1, lambda paper: count_keyword_hits(paper, keywords))
+    return ReservoirSampler(1)
+
+def select_papers_for_profiles(profiles):
+    """
+    全プロファイルの条件を合わせたクエリで1回だけ検索し、プロファイルごとに論文を1件選択する
+
+    検索結果はページを取得しながら各プロファイルの条件で判定し、候補は
+    選択器（リザーバサンプリングまたは上位k件のヒープ）にのみ保持する。
+    全プロファイルの候補数が candidate_target に達した時点で検索を打ち切る。
+    返り値はプロファイル名をキー、選択した論文（見つからない場合はNone）を値とする辞書。
+    """
+    categories = []
+    keywords = []
+    skip_keyword_query = False
+    for profile in profiles:
+        arxiv_settings = profile['arxiv']
+        categories.extend(c for c in arxiv_settings.get('categories', []) if c not in categories)
+        profile_keywords = arxiv_settings.get('filters', {}).get('keywords', [])
+        if not profile_keywords:
+            # キーワード指定のないプロファイルがあればキーワードで絞り込まない
+            skip_keyword_query = True
+        keywords.extend(k for k in profile_keywords[:3] if k not in keywords)
+    
+    max_results = max(profile['arxiv'].get('max_results', 50) for profile in profiles)
+    page_size = max(profile['arxiv'].get('page_size', 10) for profile in profiles)
+    search_timeout = max(
+        profile['arxiv'].get('search_timeout_seconds', DEFAULT_SEARCH_TIMEOUT) for profile in profiles
+    )
+    selectors = {profile['name']: create_selector(profile['arxiv']) for profile in profiles}
+    targets = {profile['name']: profile['arxiv'].get('candidate_target', 20) for profile in profiles}
     
-    for attempt in range(max_retries):
-        try:
-            print_with_timestamp(f"検索試行 {attempt + 1}/{max_retries}")
-            
-            # より軽量なクライアント設定
-            client = arxiv.Client(
-                page_size=10,  # 小さなページサイズ
-                delay_seconds=0.5,  # より短い遅延
-                num_retries=1  # 少ないリトライ
-            )
-            
-            # より具体的なクエリでヒット数を絞る
-            if keywords:
-                keyword_query = " OR ".join(f'"{keyword}"' for keyword in keywords[:3])  # 上位3つのキーワードのみ
-                category_query = " OR ".join(f"cat:{cat}" for cat in ai_categories)
-                query = f"({category_query}) AND ({keyword_query})"
-            else:
-                category_query = " OR ".join(f"cat:{cat}" for cat in ai_categories)
-                query = f"({category_query})"
-            
-            print_with_timestamp(f"検索クエリ: {query}")
-            
-            search = arxiv.Search(
-                query=query,
-                max_results=max_results,  # より小さい結果セット
-                sort_by=arxiv.SortCriterion.SubmittedDate
-            )
-            
-            # タイムアウト付きで結果を取得
-            results = []
-            count = 0
-            timeout_start = time.time()
-            timeout_duration = 30  # 30秒でタイムアウト
-            
-            for result in client.results(search):
-                results.append(result)
-                count += 1
-                
-                # タイムアウトチェック
-                if time.time() - timeout_start > timeout_duration:
-                    print_with_timestamp(f"タイムアウト: {count}件の論文を取得済み")
-                    break
-                    
-                if count >= max_results:
-                    break
-                
-            print_with_timestamp(f"ArXivから {len(results)} 件の論文を取得しました")
-            
-            if results:
-                filtered_results = filter_papers(results, max_years_old, keywords)
-                print_with_timestamp(f"フィルタリング後: {len(filtered_results)} 件の論文")
-                return filtered_results
-            else:
-                print_with_timestamp("検索結果が空でした")
-                
-        except Exception as e:
-            error_msg = str(e)
-            print_with_timestamp(f"試行 {attempt + 1} で論文検索中にエラーが発生: {error_msg}")
-            
-            # 特定のエラータイプに応じた対応
-            if "Connection" in error_msg or "timeout" in error_msg.lower():
-                if attempt < max_retries - 1:
-                    wait_time = delay * (attempt + 1)  # 線形バックオフ（高速化）
-                    print_with_timestamp(f"ネットワークエラーのため {wait_time} 秒待機してリトライします...")
-                    time.sleep(wait_time)
-                    continue
-            elif "rate limit" in error_msg.lower() or "quota" in error_msg.lower():
-                if attempt < max_retries - 1:
-                    wait_time = delay * 2
-                    print_with_timestamp(f"レート制限のため {wait_time} 秒待機してリトライします...")
-                    time.sleep(wait_time)
-                    continue
-            else:
-                print_with_timestamp(f"予期しないエラー: {error_msg}")
-                if attempt < max_retries - 1:
-                    time.sleep(delay)
-                    continue
+    print_with_timestamp(f"ArXivから{len(profiles)}プロファイル分の論文をまとめて検索します")
+    query = build_query(categories, [] if skip_keyword_query else keywords)
     
-    print_with_timestamp("すべてのリトライが失敗しました")
-    return []
+    scanned = 0
+    results = iter_results_with_retry(query, max_results, page_size, timeout=search_timeout)
+    for result in results:
+        scanned += 1
+        for profile in profiles:
+            if matches_profile(result, profile['arxiv']):
+                selectors[profile['name']].add(result)
+        
+        if all(selectors[name].seen >= target for name, target in targets.items()):
+            print_with_timestamp(f"全プロファイルの候補数が目標に達したため、{scanned}件で検索を打ち切ります")
+            results.close()
+            break
+    
+    selected = {}
+    for profile in profiles:
+        selector = selectors[profile['name']]
+        print_with_timestamp(f"プロファイル {profile['name']}: {scanned}件中 {selector.seen} 件が条件に一致")
+        papers = selector.result()
+        selected[profile['name']] = papers[0] if papers else None
+        if selected[profile['name']]:
+            print_with_timestamp(f"プロファイル {profile['name']} で選択された論文: {selected[profile['name']].title[:100]}...")
+        else:
+            print_with_timestamp(f"プロファイル {profile['name']} の論文が見つかりませんでした。")
+    return selected
 
 def search_ai_papers():
     """従来の関数を維持（後方互換性）"""
     return search_ai_papers_with_retry()
 
 def get_random_paper():
-    """論文をランダムに選択して返す"""
-    papers = search_ai_papers_with_retry()
-    if not papers:
-        print_with_timestamp("論文が見つかりませんでした。")
-        return None    
-    
-    selected_paper = random.choice(papers)
-    print_with_timestamp(f"選択された論文: {selected_paper.title[:100]}...")
-    
-    return selected_paper
+    """論文をランダムに選択して返す（トップレベルのarxiv設定を使用）"""
+    profile = {'name': 'default', 'arxiv': get_config()['arxiv']}
+    return select_papers_for_profiles([profile])['default']
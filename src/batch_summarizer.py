@@ -0,0 +1,169 @@
+"""
+複数論文をまとめて要約するためのプロンプト構築とJSON応答の解析を行うモジュール
+"""
+import json
+import re
+from .utils import print_with_timestamp
+
+# 要約の5つの観点（JSONのキー, Slack表示用の見出し, 指示文）
+SUMMARY_SECTIONS = [
+    ("overview", "研究概要", "この論文が何について研究しているのか、研究分野・背景・全体像を詳しく説明"),
+    ("problem", "解決する課題", "どのような具体的問題や課題に取り組んでいるのか、なぜその問題が重要なのかを含めて説明"),
+    ("method", "提案手法", "問題解決のためにどのような新しいアプローチや手法を提案しているのか、従来手法との違いや特徴を具体的に説明"),
+    ("results", "主要な結果", "実験や検証でどのような成果が得られたのか、具体的な数値・比較結果・改善度を詳しく記載"),
+    ("impact", "意義・インパクト", "この研究が学術界や実社会にどのような影響を与えるのか、応用可能性や今後の展望を含めて説明"),
+]
+
+def estimate_tokens(text):
+    """文字数からトークン数を概算する（英語主体の論文テキストを想定した保守的な見積もり）"""
+    return len(text) // 3 + 1
+
+def describe_paper(paper):
+    """プロンプトに埋め込む論文のメタデータを整形する"""
+    title = ' '.join(paper.title.split())
+    abstract = ' '.join(paper.summary.split())
+    authors = ", ".join(paper.authors) if paper.authors else "不明"
+    published_date = paper.published.strftime("%Y年%m月%d日") if paper.published else "不明"
+    categories = ", ".join(paper.categories) if paper.categories else "不明"
+
+    return f"""タイトル: {title}
+著者: {authors}
+公開日: {published_date}
+カテゴリ: {categories}
+
+【アブストラクト】
+{abstract}"""
+
+def format_section_guide():
+    """5つの観点の指示文を番号付きリストとして整形する"""
+    return "\n".join(
+        f"{i}. {title}（キー: \"{key}\"）: {instruction}"
+        for i, (key, title, instruction) in enumerate(SUMMARY_SECTIONS, 1)
+    )
+
+def format_json_schema():
+    """応答として要求するJSONの形式を整形する"""
+    schema_keys = ", ".join(f'"{key}": "..."' for key, _, _ in SUMMARY_SECTIONS)
+    return f'{{"papers": [{{"id": "論文のid", {schema_keys}}}]}}'
+
+def build_response_schema():
+    """構造化出力でモデルに守らせる応答のJSONスキーマを構築する"""
+    paper_keys = ["id"] + [key for key, _, _ in SUMMARY_SECTIONS]
+    return {
+        "type": "object",
+        "properties": {
+            "papers": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {key: {"type": "string"} for key in paper_keys},
+                    "required": paper_keys,
+                },
+            },
+        },
+        "required": ["papers"],
+    }
+
+def build_batch_instructions():
+    """全論文で共通の分析指示を構築する（1リクエストにつき1回だけ送る）"""
+    return f"""あなたは論文解析の専門家です。以下に示す複数の論文をそれぞれ日本語で分析し、要点を整理して出力してください。
+
+【分析指示】
+各論文について以下の5つの観点から詳細に分析し、各項目200～300文字で充実した内容にまとめてください。
+専門用語は必要に応じて分かりやすく説明を加え、具体例や数値データがある場合は積極的に含めてください。
+
+{format_section_guide()}
+
+【出力形式】
+次のJSONのみを出力してください（前後に説明文やコードブロックを付けないこと）。
+papersには入力された全ての論文を、与えられたidを付けて1件ずつ含めてください。
+{format_json_schema()}
+
+【注意事項】
+- 各項目は独立して理解できるように詳細に記述
+- 専門用語には必ず分かりやすい説明を併記
+- 客観的かつ正確な情報のみを記述し、具体例を積極的に活用
+- 初学者にも理解できるよう丁寧に説明
+- 数値データや比較結果は必ず含める
+- 推測や憶測は避け、論文に記載された事実のみを記述
+- 太文字など装飾が必要な場合はSlack形式（*テキスト*）を使用"""
+
+def build_paper_block(paper_id, paper, pdf_content):
+    """1論文分の入力ブロックを構築する"""
+    block = f"=== 論文 id: {paper_id} ===\n{describe_paper(paper)}\n"
+    if pdf_content:
+        block += f"\n{pdf_content}\n"
+    return block
+
+def pack_into_batches(items, max_input_tokens, max_papers):
+    """
+    (論文などの任意の値, 入力ブロック) のリストをトークン予算内に収まるバッチに分割する
+
+    共通の指示文のトークン数も各バッチの予算に含める。
+    単独で予算を超える論文も1件だけのバッチとして送る。
+    """
+    instruction_tokens = estimate_tokens(build_batch_instructions())
+    batches = []
+    current = []
+    current_tokens = instruction_tokens
+
+    for item, block in items:
+        block_tokens = estimate_tokens(block)
+        if current and (current_tokens + block_tokens > max_input_tokens or len(current) >= max_papers):
+            batches.append(current)
+            current = []
+            current_tokens = instruction_tokens
+        current.append((item, block))
+        current_tokens += block_tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+def build_batch_prompt(blocks):
+    """共通指示と各論文の入力ブロックから1リクエスト分のプロンプトを構築する"""
+    return build_batch_instructions() + "\n\n【論文一覧】\n\n" + "\n".join(blocks)
+
+def parse_batch_response(text, paper_ids):
+    """
+    JSON応答を検証し、論文idごとのセクション辞書に分割する
+
+    5つのセクションが揃っている論文のみを返す。
+    JSONとして解釈できない場合はValueErrorを送出する。
+    """
+    # コードブロックで囲まれて返ってきた場合に備えて外側を取り除く
+    cleaned = re.sub(r'^\s*```(?:json)?\s*|\s*```\s*$', '', text or "")
+    data = json.loads(cleaned)
+
+    entries = data.get("papers", []) if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise ValueError("papers がリストではありません")
+
+    sections_by_id = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        paper_id = str(entry.get("id", ""))
+        if paper_id not in paper_ids:
+            continue
+
+        sections = {}
+        for key, _, _ in SUMMARY_SECTIONS:
+            value = entry.get(key)
+            if isinstance(value, str) and value.strip():
+                sections[key] = value.strip()
+
+        if len(sections) == len(SUMMARY_SECTIONS):
+            sections_by_id[paper_id] = sections
+        else:
+            print_with_timestamp(f"論文 {paper_id} の応答に不足しているセクションがあります")
+
+    return sections_by_id
+
+def render_sections(sections):
+    """構造化された要約をSlackのmrkdwn形式の見出し付きテキストのリストに変換する"""
+    return [
+        f"*{title}*\n{sections[key]}"
+        for key, title, _ in SUMMARY_SECTIONS
+        if sections.get(key)
+    ]
@@ -2,41 +2,33 @@
 ChatGPTによる論文処理を行うモジュール
 """
 import os
-import requests
-import PyPDF2
-from io import BytesIO
 import openai
 from src.config_loader import get_config
 from src.utils import print_with_timestamp
+from src.map_reduce import summarize_map_reduce
+from src.deadline import stage_timeout
+from src import http_client
+from src.pdf_extractors import fetch_pdf_pages
+
+# LLM呼び出し1回あたりのタイムアウト秒数（締め切りまでの残り時間の方が短ければそちらを使う）
+LLM_TIMEOUT = 120
 
 def extract_first_and_last_pages(paper):
     """PDFの最初と最後のページのテキストを抽出"""
     try:
         print_with_timestamp("PDFをダウンロード中...")
         
-        # PDFのダウンロード
-        pdf_url = paper.pdf_url
-        response = requests.get(pdf_url, timeout=30)
-        response.raise_for_status()
-        
-        # PDFからテキスト抽出
-        pdf_file = BytesIO(response.content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        total_pages = len(pdf_reader.pages)
+        # PDFのダウンロードとテキスト抽出（最初と最後のページのみ）
+        pages, total_pages = fetch_pdf_pages(paper, first_last_only=True)
         extracted_text = ""
         
-        if total_pages > 0:
+        if pages:
             # 最初のページ
-            first_page = pdf_reader.pages[0]
-            first_page_text = first_page.extract_text()
-            extracted_text += f"=== 最初のページ ===\n{first_page_text}\n\n"
+            extracted_text += f"=== 最初のページ ===\n{pages[0]}\n\n"
             
             # 最後のページ（最初のページと異なる場合のみ）
-            if total_pages > 1:
-                last_page = pdf_reader.pages[-1]
-                last_page_text = last_page.extract_text()
-                extracted_text += f"=== 最後のページ ===\n{last_page_text}"
+            if len(pages) > 1:
+                extracted_text += f"=== 最後のページ ===\n{pages[-1]}"
         
         print_with_timestamp(f"PDF処理完了: {total_pages}ページ中、最初と最後のページを抽出")
         return extracted_text[:4000]  # トークン制限対策で4000文字まで
@@ -45,23 +37,30 @@ def extract_first_and_last_pages(paper):
         print_with_timestamp(f"PDF処理エラー: {e}")
         return ""
 
-def process_paper_with_chatgpt(paper):
-    config = get_config()
-    api_key = os.environ.get('OPENAI_API_KEY', '')
-    model_name = config.get('chatgpt', {}).get('model', 'gpt-3.5-turbo')
-    temperature = config.get('chatgpt', {}).get('temperature', 0.7)
+def process_paper_with_chatgpt(paper, settings=None, degradation_level="full"):
+    """
+    ChatGPTで論文を要約する
+
+    degradation_level が "abstract_only" の場合はPDFを取得せず、出力トークン数を減らす。
+    """
+    chatgpt_config = settings if settings is not None else get_config().get('chatgpt', {})
+    api_key_env = chatgpt_config.get('openai_api_key_env', 'OPENAI_API_KEY')
+    api_key = os.environ.get(api_key_env, '')
+    model_name = chatgpt_config.get('model', 'gpt-3.5-turbo')
+    temperature = chatgpt_config.get('temperature', 0.7)
 
     if not api_key:
         print_with_timestamp("OpenAI APIキーが設定されていません。ChatGPTによる処理をスキップします。")
         return paper
 
     try:
-        openai.api_key = api_key
+        # リトライは http_client の共通ポリシーで行うため、SDKのリトライは無効にする
+        client = openai.OpenAI(api_key=api_key, max_retries=0)
         title = ' '.join(paper.title.split())
         abstract = ' '.join(paper.summary.split())
         
         # 著者情報の取得
-        authors = ", ".join([author.name for author in paper.authors]) if paper.authors else "不明"
+        authors = ", ".join(paper.authors) if paper.authors else "不明"
         
         # 公開日の取得
         published_date = paper.published.strftime("%Y年%m月%d日") if paper.published else "不明"
@@ -69,8 +68,13 @@ def process_paper_with_chatgpt(paper):
         # カテゴリの取得
         categories = ", ".join(paper.categories) if paper.categories else "不明"
         
-        # PDFの最初と最後のページを取得
-        pdf_content = extract_first_and_last_pages(paper)
+        # PDFの最初と最後のページを取得（残り時間が少ない場合はアブストラクトのみ）
+        if degradation_level == "abstract_only":
+            pdf_content = ""
+            max_tokens = 1024
+        else:
+            pdf_content = extract_first_and_last_pages(paper)
+            max_tokens = 2048
         
         prompt = f"""以下の論文を日本語で要約し、要点を以下のフォーマットに従って500~800文字で出力してください。
 Slack用のフォーマットで出力してください（太文字は *テキスト* で囲み、区切り線は --- を使用）。
@@ -117,13 +121,16 @@ Slack用のフォーマットで出力してください（太文字は *テキ
 *📝 結論*
 内容をここに記載
 """
-        response = openai.ChatCompletion.create(
+        response = http_client.call_with_retry(
+            http_client.OPENAI_HOST,
+            client.chat.completions.create,
             model=model_name,
             messages=[
                 {"role": "user", "content": prompt}
             ],
             temperature=temperature,
-            max_tokens=2048
+            max_tokens=max_tokens,
+            timeout=stage_timeout(LLM_TIMEOUT)
         )
         paper.chatgpt_result = response.choices[0].message.content
         print_with_timestamp("ChatGPT APIで要約を生成しました")
@@ -149,3 +156,49 @@ Slack用のフォーマットで出力してください（太文字は *テキ
             paper.chatgpt_result = "※ OpenAI API処理中にエラーが発生したため、要約を生成できませんでした。"
         
         return paper
+
+def process_paper_with_chatgpt_map_reduce(paper, map_reduce_config, settings=None):
+    """
+    論文全文をmap-reduceでChatGPTにより要約する
+
+    結果は paper.chatgpt_sections に格納する。全文を要約できなかった場合は
+    process_paper_with_chatgpt による従来の要約にフォールバックする。
+    """
+    chatgpt_config = settings if settings is not None else get_config().get('chatgpt', {})
+    api_key_env = chatgpt_config.get('openai_api_key_env', 'OPENAI_API_KEY')
+    api_key = os.environ.get(api_key_env, '')
+    model_name = chatgpt_config.get('model', 'gpt-3.5-turbo')
+    temperature = chatgpt_config.get('temperature', 0.7)
+
+    if not api_key:
+        print_with_timestamp("OpenAI APIキーが設定されていません。ChatGPTによる処理をスキップします。")
+        return paper
+
+    # リトライは http_client の共通ポリシーで行うため、SDKのリトライは無効にする
+    client = openai.OpenAI(api_key=api_key, max_retries=0)
+
+    def generate(prompt, max_output_tokens, json_output):
+        options = {}
+        if json_output:
+            options["response_format"] = {"type": "json_object"}
+        response = http_client.call_with_retry(
+            http_client.OPENAI_HOST,
+            client.chat.completions.create,
+            model=model_name,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_output_tokens,
+            timeout=stage_timeout(LLM_TIMEOUT),
+            **options
+        )
+        return response.choices[0].message.content
+
+    sections = summarize_map_reduce(paper, generate, map_reduce_config)
+    if sections:
+        paper.chatgpt_sections = sections
+        return paper
+
+    print_with_timestamp("map-reduce要約に失敗したため、通常の要約にフォールバックします")
+    return process_paper_with_chatgpt(paper, settings=chatgpt_config)
@@ -29,3 +29,34 @@ def get_config():
     if not config:
         return load_config()
     return config
+
+# プロファイルごとに上書きできる設定セクション
+PROFILE_SECTIONS = ['arxiv', 'llm', 'gemini', 'chatgpt', 'slack', 'outbox']
+
+def merge_settings(base, override):
+    """辞書を再帰的にマージする（overrideの値を優先）"""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_settings(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def get_profiles():
+    """
+    設定からプロファイルの一覧を取得する
+
+    各プロファイルはトップレベルの設定を引き継ぎ、指定したセクションのみを上書きする。
+    profilesが未指定の場合はトップレベルの設定を "default" プロファイルとして扱う。
+    """
+    config = get_config()
+    raw_profiles = config.get('profiles') or [{'name': 'default'}]
+
+    profiles = []
+    for i, raw in enumerate(raw_profiles, 1):
+        profile = {'name': raw.get('name', f'profile{i}')}
+        for section in PROFILE_SECTIONS:
+            profile[section] = merge_settings(config.get(section) or {}, raw.get(section) or {})
+        profiles.append(profile)
+    return profiles
@@ -0,0 +1,84 @@
+"""
+実行全体の締め切り時刻を管理し、各処理に残り時間を配分するモジュール
+"""
+import time
+from .metrics import set_metric, get_metrics
+
+# 残り時間が少ないほど軽い処理に切り替える（後ろほど劣化が大きい）
+DEGRADATION_LEVELS = [
+    "full",              # 通常の処理（PDFの重要セクション抽出・map-reduce要約）
+    "first_last_pages",  # PDFの最初と最後のページのみを使用
+    "abstract_only",     # PDFを取得せず、短い出力でLLM要約
+    "no_llm",            # LLMを使用せずアブストラクトをそのまま投稿
+]
+
+# グローバル変数として締め切り時刻を保持（Noneの場合は締め切りなし）
+deadline_at = None
+# Slack送信のために確保しておく秒数（送信の直前に release_reserve で解放する）
+reserved_seconds = 0
+
+def start_deadline(seconds, reserve_seconds=0):
+    """
+    現在時刻からseconds秒後を締め切りとして設定する（Noneまたは0以下で無効）
+
+    reserve_secondsは最後のSlack送信のために確保する秒数で、それまでの処理には
+    締め切りのreserve_seconds秒前までしか時間を配分しない。
+    """
+    global deadline_at, reserved_seconds
+    deadline_at = time.monotonic() + seconds if seconds and seconds > 0 else None
+    reserved_seconds = reserve_seconds or 0
+    set_metric('deadline_seconds', seconds if deadline_at else None)
+
+def release_reserve():
+    """Slack送信のために確保していた時間を解放する（送信の直前に呼び出す）"""
+    global reserved_seconds
+    reserved_seconds = 0
+
+def remaining_seconds():
+    """
+    現在の処理が使える残り秒数を返す（締め切りがない場合はNone）
+
+    Slack送信のための時間を確保している間は、その分を差し引いた秒数を返す。
+    """
+    if deadline_at is None:
+        return None
+    return max(0.0, deadline_at - time.monotonic() - reserved_seconds)
+
+def is_expired():
+    remaining = remaining_seconds()
+    return remaining is not None and remaining <= 0
+
+def stage_timeout(default, minimum=1.0):
+    """
+    処理段階に与えるタイムアウト秒数を返す
+
+    既定値defaultと締め切りまでの残り時間の短い方を返す。ネットワーク処理が
+    即座に失敗しないよう、最低でもminimum秒は確保する。
+    """
+    remaining = remaining_seconds()
+    if remaining is None:
+        return default
+    return max(minimum, min(default, remaining))
+
+def choose_degradation_level(thresholds):
+    """
+    残り時間に応じた劣化レベルを選び、メトリクスに記録して返す
+
+    thresholds には各レベルに切り替える残り秒数
+    （first_last_pages_below, abstract_only_below, no_llm_below）を指定する。
+    """
+    remaining = remaining_seconds()
+    level = "full"
+    if remaining is not None:
+        if remaining < thresholds.get('no_llm_below', 45):
+            level = "no_llm"
+        elif remaining < thresholds.get('abstract_only_below', 120):
+            level = "abstract_only"
+        elif remaining < thresholds.get('first_last_pages_below', 240):
+            level = "first_last_pages"
+
+    # 複数回選択した場合は最も劣化したレベルを記録する
+    recorded = get_metrics().get('degradation_level', "full")
+    if DEGRADATION_LEVELS.index(level) >= DEGRADATION_LEVELS.index(recorded):
+        set_metric('degradation_level', level)
+    return level
@@ -3,41 +3,34 @@ Gemini 1.5 Proによる論文処理を行うモジュール
 """
 import os
 import re
-import requests
-import PyPDF2
-from io import BytesIO
 import google.generativeai as genai
 from src.config_loader import get_config
 from src.utils import print_with_timestamp
+from src.deadline import stage_timeout, is_expired
+from src import http_client
+from src.pdf_extractors import fetch_pdf_pages
+from src.section_extractor import SECTION_KEYWORDS, extract_section
+from src.batch_summarizer import (
+    build_paper_block, build_batch_prompt, build_response_schema, pack_into_batches, parse_batch_response
+)
+from src.map_reduce import summarize_map_reduce
+
+# LLM呼び出し1回あたりのタイムアウト秒数（締め切りまでの残り時間の方が短ければそちらを使う）
+LLM_TIMEOUT = 120
 
 def extract_intelligent_content(paper):
     """論文から重要なセクションを賢く抽出"""
     try:
         print_with_timestamp("PDFをダウンロード中...")
         
-        # PDFのダウンロード
-        pdf_url = paper.pdf_url
-        response = requests.get(pdf_url, timeout=30)
-        response.raise_for_status()
-        
-        # PDFからテキスト抽出
-        pdf_file = BytesIO(response.content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        total_pages = len(pdf_reader.pages)
-        all_text = ""
-        
-        # 全ページのテキストを結合
-        for page in pdf_reader.pages:
-            all_text += page.extract_text() + "\n"
+        # PDFのダウンロードとテキスト抽出
+        pages, total_pages = fetch_pdf_pages(paper)
+        all_text = "\n".join(pages)
         
         # セクション情報を抽出
         extracted_info = {
             'total_pages': total_pages,
-            'introduction': extract_section(all_text, ['introduction', '1.', 'はじめに', '序論']),
-            'method': extract_section(all_text, ['method', 'approach', '手法', '方法', 'methodology']),
-            'results': extract_section(all_text, ['result', 'experiment', '実験', '結果', 'evaluation']),
-            'conclusion': extract_section(all_text, ['conclusion', 'discussion', '結論', '考察', 'まとめ']),
+            **{name: extract_section(all_text, keywords) for name, keywords in SECTION_KEYWORDS.items()},
             'keywords': extract_keywords(all_text),
             'figures_tables': extract_figures_and_tables(all_text)
         }
@@ -52,22 +45,6 @@ def extract_intelligent_content(paper):
         print_with_timestamp(f"PDF処理エラー: {e}")
         return ""
 
-def extract_section(text, keywords):
-    """特定のセクションをキーワードベースで抽出"""
-    text_lower = text.lower()
-    
-    for keyword in keywords:
-        # セクションヘッダーを探す
-        pattern = rf'(?:^|\n)\s*(?:\d+\.?\s*)?{re.escape(keyword.lower())}.*?\n(.*?)(?=\n\s*(?:\d+\.?\s*)?[a-zA-Z]|$)'
-        match = re.search(pattern, text_lower, re.DOTALL | re.IGNORECASE)
-        
-        if match:
-            section_text = match.group(1).strip()
-            # 最初の500文字程度を返す
-            return section_text[:500] if section_text else ""
-    
-    return ""
-
 def extract_keywords(text):
     """論文からキーワードを抽出"""
     # Keywords, キーワード, Index Terms などの後に続く単語を抽出
@@ -140,29 +117,17 @@ def extract_first_and_last_pages(paper):
     try:
         print_with_timestamp("PDFをダウンロード中...")
         
-        # PDFのダウンロード
-        pdf_url = paper.pdf_url
-        response = requests.get(pdf_url, timeout=30)
-        response.raise_for_status()
-        
-        # PDFからテキスト抽出
-        pdf_file = BytesIO(response.content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        total_pages = len(pdf_reader.pages)
+        # PDFのダウンロードとテキスト抽出（最初と最後のページのみ）
+        pages, total_pages = fetch_pdf_pages(paper, first_last_only=True)
         extracted_text = ""
         
-        if total_pages > 0:
+        if pages:
             # 最初のページ
-            first_page = pdf_reader.pages[0]
-            first_page_text = first_page.extract_text()
-            extracted_text += f"=== 最初のページ ===\n{first_page_text}\n\n"
+            extracted_text += f"=== 最初のページ ===\n{pages[0]}\n\n"
             
             # 最後のページ（最初のページと異なる場合のみ）
-            if total_pages > 1:
-                last_page = pdf_reader.pages[-1]
-                last_page_text = last_page.extract_text()
-                extracted_text += f"=== 最後のページ ===\n{last_page_text}"
+            if len(pages) > 1:
+                extracted_text += f"=== 最後のページ ===\n{pages[-1]}"
         
         print_with_timestamp(f"PDF処理完了: {total_pages}ページ中、最初と最後のページを抽出")
         return extracted_text[:4000]  # トークン制限対策で4000文字まで
@@ -171,12 +136,12 @@ def extract_first_and_last_pages(paper):
         print_with_timestamp(f"PDF処理エラー: {e}")
         return ""
 
-def process_paper_with_gemini(paper):
-    config = get_config()
-    api_key_env = config.get('gemini', {}).get('gemini_api_key_env', 'GEMINI_API_KEY')
+def process_paper_with_gemini(paper, pdf_content=None, settings=None, max_output_tokens=4096):
+    gemini_config = settings if settings is not None else get_config().get('gemini', {})
+    api_key_env = gemini_config.get('gemini_api_key_env', 'GEMINI_API_KEY')
     api_key = os.environ.get(api_key_env, '')
-    model_name = config.get('gemini', {}).get('model', 'models/gemini-1.5-pro-latest')
-    temperature = config.get('gemini', {}).get('temperature', 0.7)
+    model_name = gemini_config.get('model', 'models/gemini-1.5-pro-latest')
+    temperature = gemini_config.get('temperature', 0.7)
 
     if not api_key:
         return paper
@@ -188,7 +153,7 @@ def process_paper_with_gemini(paper):
         abstract = ' '.join(paper.summary.split())
         
         # 著者情報の取得
-        authors = ", ".join([author.name for author in paper.authors]) if paper.authors else "不明"
+        authors = ", ".join(paper.authors) if paper.authors else "不明"
         
         # 公開日の取得
         published_date = paper.published.strftime("%Y年%m月%d日") if paper.published else "不明"
@@ -196,8 +161,9 @@ def process_paper_with_gemini(paper):
         # カテゴリの取得
         categories = ", ".join(paper.categories) if paper.categories else "不明"
         
-        # PDFから重要なセクションを知的に抽出
-        pdf_content = extract_intelligent_content(paper)
+        # PDFから重要なセクションを知的に抽出（抽出済みの場合は再利用）
+        if pdf_content is None:
+            pdf_content = extract_intelligent_content(paper)
         
         prompt = f"""あなたは論文解析の専門家です。以下の論文を日本語で分析し、要点を整理して出力してください。
 
@@ -255,12 +221,15 @@ Slack形式で出力してください（太文字は *テキスト* で表現
 - 初学者にも理解できるよう丁寧に説明
 - 数値データや比較結果は必ず含める
 - 推測や憶測は避け、論文に記載された事実のみを記述"""
-        response = model.generate_content(
+        response = http_client.call_with_retry(
+            http_client.GEMINI_HOST,
+            model.generate_content,
             prompt,
             generation_config={
                 "temperature": temperature,
-                "max_output_tokens": 4096  # 出力トークン数を大幅に増加
-            }
+                "max_output_tokens": max_output_tokens  # 出力トークン数を大幅に増加
+            },
+            request_options={"timeout": stage_timeout(LLM_TIMEOUT)}
         )
         paper.gemini_result = response.text
         print_with_timestamp("Gemini APIで要約を生成しました")
@@ -285,4 +254,139 @@ Slack形式で出力してください（太文字は *テキスト* で表現
             print_with_timestamp(f"Geminiによる処理中にエラーが発生しました: {e}")
             paper.gemini_result = "※ Gemini API処理中にエラーが発生したため、要約を生成できませんでした。"
         
-        return paper 
\ No newline at end of file
+        return paper
+
+def process_papers_with_gemini_batch(papers, settings=None, degradation_level="full"):
+    """
+    複数の論文を1リクエストにまとめてGeminiで要約する
+
+    共通の分析指示はリクエストごとに1回だけ送り、応答はJSONで受け取って
+    paper.gemini_sections に論文ごとのセクション辞書として格納する。
+    応答はJSONスキーマで構造化して受け取り、解析できなかった場合や応答に含まれなかった
+    論文のみ process_paper_with_gemini で1件ずつ処理する。タイムアウトなど通信のエラーで
+    失敗した場合は、同じAPIへの呼び出しを増やさないよう単独処理はせずエラーとして扱う。
+    settings を省略した場合は設定ファイルの gemini セクションを使用する。
+    degradation_level に応じてPDFの抽出方法と出力トークン数を軽くする。
+    """
+    gemini_config = settings if settings is not None else get_config().get('gemini', {})
+    api_key_env = gemini_config.get('gemini_api_key_env', 'GEMINI_API_KEY')
+    api_key = os.environ.get(api_key_env, '')
+    model_name = gemini_config.get('model', 'models/gemini-1.5-pro-latest')
+    temperature = gemini_config.get('temperature', 0.7)
+    batch_config = gemini_config.get('batch', {})
+    max_input_tokens = batch_config.get('max_input_tokens', 30000)
+    max_papers = batch_config.get('max_papers', 4)
+    output_tokens_per_paper = batch_config.get('output_tokens_per_paper', 2048)
+    max_output_tokens = batch_config.get('max_output_tokens', 8192)
+
+    if degradation_level == "abstract_only":
+        output_tokens_per_paper = batch_config.get('degraded_output_tokens_per_paper', 1024)
+
+    if not api_key or not papers:
+        return papers
+
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name)
+
+    # 論文ごとにバッチ内で一意なidを振り、PDFの抽出結果はフォールバック時にも再利用する
+    entries = []
+    for i, paper in enumerate(papers, 1):
+        paper_id = f"p{i}"
+        if degradation_level == "abstract_only" or is_expired():
+            pdf_content = ""
+        elif degradation_level == "first_last_pages":
+            pdf_content = extract_first_and_last_pages(paper)
+        else:
+            pdf_content = extract_intelligent_content(paper)
+        entries.append(((paper_id, paper, pdf_content), build_paper_block(paper_id, paper, pdf_content)))
+    batches = pack_into_batches(entries, max_input_tokens, max_papers)
+
+    for batch in batches:
+        batch_entries = [entry for entry, _ in batch]
+        sections_by_id = {}
+        request_failed = False
+
+        print_with_timestamp(f"Gemini APIで{len(batch_entries)}件の論文をまとめて要約します")
+        try:
+            response = http_client.call_with_retry(
+                http_client.GEMINI_HOST,
+                model.generate_content,
+                build_batch_prompt([block for _, block in batch]),
+                generation_config={
+                    "temperature": temperature,
+                    "max_output_tokens": min(output_tokens_per_paper * len(batch_entries), max_output_tokens),
+                    "response_mime_type": "application/json",
+                    "response_schema": build_response_schema()
+                },
+                request_options={"timeout": stage_timeout(LLM_TIMEOUT)}
+            )
+        except Exception as e:
+            print_with_timestamp(f"Geminiによるバッチ処理中にエラーが発生しました: {e}")
+            request_failed = True
+        else:
+            try:
+                sections_by_id = parse_batch_response(response.text, {paper_id for paper_id, _, _ in batch_entries})
+            except ValueError as e:
+                print_with_timestamp(f"Geminiのバッチ応答を解析できませんでした: {e}")
+
+        for paper_id, paper, pdf_content in batch_entries:
+            sections = sections_by_id.get(paper_id)
+            if sections:
+                paper.gemini_sections = sections
+            elif request_failed:
+                paper.gemini_result = "※ Gemini API処理中にエラーが発生したため、要約を生成できませんでした。"
+            else:
+                # 応答に含まれなかった論文は単独で処理する
+                print_with_timestamp(f"単独処理にフォールバックします: {paper.title[:100]}")
+                process_paper_with_gemini(
+                    paper,
+                    pdf_content=pdf_content,
+                    settings=gemini_config,
+                    max_output_tokens=min(output_tokens_per_paper * 2, 4096)
+                )
+
+        print_with_timestamp(f"Gemini APIで{len(sections_by_id)}/{len(batch_entries)}件の要約をバッチで生成しました")
+
+    return papers
+
+def process_paper_with_gemini_map_reduce(paper, map_reduce_config, settings=None):
+    """
+    論文全文をmap-reduceでGeminiにより要約する
+
+    結果は paper.gemini_sections に格納する。全文を要約できなかった場合は
+    process_paper_with_gemini による従来の要約にフォールバックする。
+    """
+    gemini_config = settings if settings is not None else get_config().get('gemini', {})
+    api_key_env = gemini_config.get('gemini_api_key_env', 'GEMINI_API_KEY')
+    api_key = os.environ.get(api_key_env, '')
+    model_name = gemini_config.get('model', 'models/gemini-1.5-pro-latest')
+    temperature = gemini_config.get('temperature', 0.7)
+
+    if not api_key:
+        return paper
+
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name)
+
+    def generate(prompt, max_output_tokens, json_output):
+        generation_config = {
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens
+        }
+        if json_output:
+            generation_config["response_mime_type"] = "application/json"
+        return http_client.call_with_retry(
+            http_client.GEMINI_HOST,
+            model.generate_content,
+            prompt,
+            generation_config=generation_config,
+            request_options={"timeout": stage_timeout(LLM_TIMEOUT)}
+        ).text
+
+    sections = summarize_map_reduce(paper, generate, map_reduce_config)
+    if sections:
+        paper.gemini_sections = sections
+        return paper
+
+    print_with_timestamp("map-reduce要約に失敗したため、通常の要約にフォールバックします")
+    return process_paper_with_gemini(paper, settings=gemini_config)
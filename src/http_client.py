@@ -0,0 +1,278 @@
+"""
+外部へのHTTP通信を共通化するモジュール
+
+接続を使い回すセッション、ステータスコードとRetry-Afterに基づく
+ジッター付き指数バックオフ、ホストごとの同時実行数の上限とサーキットブレーカーを提供し、
+ホストごとのレイテンシとリトライ回数をメトリクスに記録する。
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from .config_loader import get_config
+from .deadline import remaining_seconds, stage_timeout
+from .metrics import increment_metric, observe_metric
+from .utils import print_with_timestamp
+
+# リトライの対象とするHTTPステータスコード
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# 自動でリトライしてもサーバー側の処理が重複しないHTTPメソッド
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# タイムアウトが指定されていないリクエストの既定のタイムアウト（秒）
+DEFAULT_TIMEOUT = 30
+
+# LLM APIのホスト名（SDK経由の呼び出しでホストごとの制御に使う）
+GEMINI_HOST = "generativelanguage.googleapis.com"
+OPENAI_HOST = "api.openai.com"
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているため、リクエストを送らずに失敗したことを表す"""
+
+class RetryableStatusError(Exception):
+    """リトライ対象のステータスコードが返されたことを表す"""
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}: {response.url}")
+        self.response = response
+
+class DeadlineTimeoutAdapter(HTTPAdapter):
+    """
+    タイムアウトが指定されていないリクエストに既定のタイムアウトを設定するアダプタ
+
+    外部ライブラリが内部でタイムアウトなしにリクエストを送る場合でも、
+    締め切りまでの残り時間を超えて待たないようにする。
+    """
+    def __init__(self, default_timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.default_timeout = default_timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = stage_timeout(self.default_timeout)
+        return super().send(request, timeout=timeout, **kwargs)
+
+# グローバル変数としてセッションとホストごとの状態を保持
+session = None
+host_semaphores = {}
+circuits = {}
+state_lock = threading.Lock()
+
+def get_http_config():
+    return get_config().get('http', {})
+
+def get_session():
+    """接続プールを持つ共有セッションを返す"""
+    global session
+    with state_lock:
+        if session is None:
+            pool_maxsize = get_http_config().get('pool_maxsize', 10)
+            session = requests.Session()
+            adapter = DeadlineTimeoutAdapter(DEFAULT_TIMEOUT, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        return session
+
+def get_host_semaphore(host):
+    """ホストごとの同時実行数を制限するセマフォを返す"""
+    with state_lock:
+        if host not in host_semaphores:
+            host_limits = get_http_config().get('host_limits', {})
+            limit = host_limits.get(host, host_limits.get('default', 4))
+            host_semaphores[host] = threading.BoundedSemaphore(max(1, limit))
+        return host_semaphores[host]
+
+def check_circuit(host):
+    """サーキットブレーカーが開いている場合はCircuitOpenErrorを送出する"""
+    with state_lock:
+        circuit = circuits.get(host)
+        if circuit and circuit['open_until'] > time.monotonic():
+            raise CircuitOpenError(f"{host} へのリクエストは一時的に停止されています")
+
+def record_result(host, success):
+    """
+    リクエストの成否を記録し、連続失敗回数が閾値に達したらサーキットブレーカーを開く
+
+    サーキットブレーカーを開いた場合にTrueを返す。
+    """
+    breaker_config = get_http_config().get('circuit_breaker', {})
+    failure_threshold = breaker_config.get('failure_threshold', 5)
+    reset_seconds = breaker_config.get('reset_seconds', 60)
+
+    with state_lock:
+        circuit = circuits.setdefault(host, {'failures': 0, 'open_until': 0.0})
+        if success:
+            circuit['failures'] = 0
+            return False
+        circuit['failures'] += 1
+        if circuit['failures'] < failure_threshold:
+            return False
+        circuit['open_until'] = time.monotonic() + reset_seconds
+        circuit['failures'] = 0
+
+    increment_metric(f"http.{host}.circuit_opened")
+    print_with_timestamp(f"{host} への失敗が続いたため、{reset_seconds}秒間リクエストを停止します")
+    return True
+
+def get_status_code(error):
+    """例外からHTTPステータスコードを取り出す（SDKごとの属性名の違いを吸収する）"""
+    if isinstance(error, RetryableStatusError):
+        return error.response.status_code
+    response = getattr(error, 'response', None)
+    if response is not None and isinstance(getattr(response, 'status_code', None), int):
+        return response.status_code
+    for attribute in ('status_code', 'http_status', 'status', 'code'):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+def get_retry_after(error):
+    """Retry-Afterヘッダーの待機秒数を返す（指定がない場合はNone）"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error):
+    """接続エラー・タイムアウト・リトライ対象のステータスコードの場合にTrueを返す"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status_code = get_status_code(error)
+    return status_code in RETRYABLE_STATUS_CODES
+
+def is_connection_failure(error):
+    """接続の確立に失敗した（リクエストがサーバーに届いていない）場合にTrueを返す"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError):
+        return False
+    # 接続拒否や名前解決の失敗はurllib3のNewConnectionErrorが原因になる
+    # （送信後に接続が切れた場合はサーバーに届いている可能性がある）
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, NewConnectionError)
+
+def is_retryable_non_idempotent(error):
+    """
+    POSTなど冪等でないリクエストをリトライしてよい場合にTrueを返す
+
+    リクエストがサーバーに届いていないことが確実な場合と、Retry-After付きの429の場合のみ。
+    タイムアウトや5xxはサーバーで処理済みの可能性があるためリトライしない。
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if is_connection_failure(error):
+        return True
+    return get_status_code(error) == 429 and get_retry_after(error) is not None
+
+def compute_backoff(attempt, error=None, base=None):
+    """
+    リトライまでの待機秒数を返す
+
+    Retry-Afterが指定されていればそれに従い、なければ上限付きの
+    指数バックオフにフルジッター（0から上限までの一様乱数）を適用する。
+    baseを省略した場合は設定の backoff_base を使う。
+    """
+    http_config = get_http_config()
+    if base is None:
+        base = http_config.get('backoff_base', 1.0)
+    backoff_max = http_config.get('backoff_max', 30.0)
+
+    retry_after = get_retry_after(error) if error is not None else None
+    if retry_after is not None:
+        return min(retry_after, backoff_max)
+    return random.uniform(0, min(backoff_max, base * (2 ** attempt)))
+
+def record_attempt(host, start):
+    """1回の試行のリクエスト数とレイテンシをメトリクスに記録する"""
+    increment_metric(f"http.{host}.requests")
+    observe_metric(f"http.{host}.latency_ms", (time.monotonic() - start) * 1000)
+
+def call_with_retry(host, func, *args, retry_on=is_retryable, **kwargs):
+    """
+    ホストごとの同時実行数の上限とサーキットブレーカーのもとで関数を呼び出し、
+    リトライ可能なエラーの場合はバックオフしてから再試行する
+
+    SDKを経由するLLM APIの呼び出しなど、requestsを直接使わない通信にも使う。
+    retry_onはエラーをリトライしてよいかを判定する関数で、Noneの場合はリトライしない。
+    """
+    max_retries = get_http_config().get('max_retries', 3) if retry_on else 0
+
+    for attempt in range(max_retries + 1):
+        check_circuit(host)
+        start = time.monotonic()
+        try:
+            with get_host_semaphore(host):
+                result = func(*args, **kwargs)
+        except Exception as e:
+            record_attempt(host, start)
+            increment_metric(f"http.{host}.errors")
+            # 4xxなどリクエスト側の問題はホストの障害ではないため、サーキットブレーカーの失敗に数えない
+            status_code = get_status_code(e)
+            opened = False
+            if is_retryable(e) or (status_code is not None and status_code >= 500):
+                opened = record_result(host, False)
+            # サーキットブレーカーが開いた場合はそれ以上リトライしない
+            retryable = not opened and retry_on is not None and retry_on(e)
+
+            wait_time = compute_backoff(attempt, e)
+            remaining = remaining_seconds()
+            if not retryable or attempt >= max_retries or (remaining is not None and remaining <= wait_time):
+                raise
+
+            increment_metric(f"http.{host}.retries")
+            reason = f"HTTP {status_code}" if status_code else type(e).__name__
+            print_with_timestamp(f"{host} への通信に失敗しました（{reason}）。{wait_time:.1f}秒後にリトライします...")
+            time.sleep(wait_time)
+            continue
+
+        record_attempt(host, start)
+        record_result(host, True)
+        return result
+
+def send_request(method, url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """共有セッションでリクエストを送り、リトライ対象のステータスコードは例外として扱う"""
+    response = get_session().request(method, url, timeout=stage_timeout(timeout), **kwargs)
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        raise RetryableStatusError(response)
+    return response
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, retry=True, **kwargs):
+    """
+    共通のリトライ・同時実行制御のもとでHTTPリクエストを送る
+
+    timeoutは1回の試行あたりの上限で、締め切りまでの残り時間の方が短ければそちらを使う。
+    POSTなど冪等でないメソッドは、サーバーに届いていないことが確実な場合のみリトライする。
+    retry=Falseの場合はリトライせず、最初のエラーをそのまま送出する。
+    """
+    host = urlparse(url).netloc
+    if not retry:
+        retry_on = None
+    elif method.upper() in IDEMPOTENT_METHODS:
+        retry_on = is_retryable
+    else:
+        retry_on = is_retryable_non_idempotent
+    return call_with_retry(host, send_request, method, url, timeout=timeout, retry_on=retry_on, **kwargs)
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
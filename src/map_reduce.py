@@ -0,0 +1,188 @@
+"""
+論文全文をチャンクに分割し、並列に要約してから統合する（map-reduce要約）モジュール
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from .batch_summarizer import (
+    describe_paper, estimate_tokens, format_section_guide, format_json_schema, parse_batch_response
+)
+from .utils import print_with_timestamp
+from .deadline import is_expired
+from .pdf_extractors import fetch_pdf_pages
+
+# セクション見出しとみなす行（番号付き見出し、または代表的な見出し語のみの行）
+SECTION_HEADER_PATTERN = re.compile(
+    r'^\s*(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.)\s+[A-Z][^\n]{2,80}'
+    r'|(?:abstract|introduction|related work|background|preliminaries|methods?|methodology|approach'
+    r'|experiments?|experimental setup|results|evaluation|discussion|conclusions?|limitations|appendix)\s*)$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# 参考文献以降は要約に不要なため切り捨てる
+REFERENCES_PATTERN = re.compile(r'^\s*(?:references|bibliography)\s*$', re.IGNORECASE | re.MULTILINE)
+
+def extract_full_text(paper):
+    """PDFをダウンロードして全ページのテキストを返す"""
+    try:
+        print_with_timestamp("PDFをダウンロード中（全文）...")
+        pages, total_pages = fetch_pdf_pages(paper)
+        print_with_timestamp(f"PDF処理完了: {total_pages}ページ中{len(pages)}ページの全文を抽出")
+        return "\n".join(pages)
+    except Exception as e:
+        print_with_timestamp(f"PDF処理エラー: {e}")
+        return ""
+
+def split_into_sections(text):
+    """テキストをセクション見出しの位置で分割する"""
+    references = REFERENCES_PATTERN.search(text)
+    if references:
+        text = text[:references.start()]
+
+    starts = [match.start() for match in SECTION_HEADER_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(text))
+
+    return [text[start:end].strip() for start, end in zip(starts, starts[1:]) if text[start:end].strip()]
+
+def split_into_chunks(text, chunk_chars):
+    """
+    テキストをセクション境界でchunk_chars以下のチャンクにまとめる
+
+    1つのセクションがchunk_charsを超える場合は段落（空行または改行）の境界で分割する。
+    """
+    pieces = []
+    for section in split_into_sections(text):
+        if len(section) <= chunk_chars:
+            pieces.append(section)
+            continue
+
+        current = ""
+        for paragraph in re.split(r'\n\s*\n|\n', section):
+            if current and len(current) + len(paragraph) + 1 > chunk_chars:
+                if len(paragraph) <= chunk_chars:
+                    pieces.append(current)
+                else:
+                    # 見出しなどの直前のテキストが単独のチャンクにならないよう、長い段落の先頭につなげて分割する
+                    paragraph = f"{current}\n{paragraph}"
+                current = ""
+            # 改行のない長い段落は文字数で強制的に分割する
+            while len(paragraph) > chunk_chars:
+                pieces.append(paragraph[:chunk_chars])
+                paragraph = paragraph[chunk_chars:]
+            current = f"{current}\n{paragraph}" if current else paragraph
+        if current:
+            pieces.append(current)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def limit_chunks(chunks, max_total_tokens):
+    """チャンクを先頭から順に、合計トークン数がmax_total_tokensを超えない範囲で返す"""
+    limited = []
+    total_tokens = 0
+    for chunk in chunks:
+        chunk_tokens = estimate_tokens(chunk)
+        if limited and total_tokens + chunk_tokens > max_total_tokens:
+            print_with_timestamp(f"トークン上限のため {len(chunks) - len(limited)} 件のチャンクを省略します")
+            break
+        limited.append(chunk)
+        total_tokens += chunk_tokens
+    return limited
+
+def build_map_prompt(paper, chunk, index, total):
+    """1チャンク分の部分要約を依頼するプロンプトを構築する"""
+    return f"""あなたは論文解析の専門家です。以下は論文本文の一部（{index}/{total}）です。
+この部分に書かれている内容を、後で論文全体の要約に統合できるよう日本語で簡潔に要約してください。
+研究の背景・課題・手法・実験設定・数値結果・結論に関わる記述は、具体的な数値や固有名詞を残してください。
+この部分に含まれない内容は推測で補わないでください。
+
+【論文情報】
+{describe_paper(paper)}
+
+【本文（{index}/{total}）】
+{chunk}"""
+
+def build_reduce_prompt(paper, partial_summaries):
+    """部分要約を統合して5つの観点の要約を依頼するプロンプトを構築する"""
+    partials = "\n\n".join(
+        f"--- 部分要約 {i}/{len(partial_summaries)} ---\n{summary}"
+        for i, summary in enumerate(partial_summaries, 1)
+    )
+    return f"""あなたは論文解析の専門家です。以下は1本の論文の本文を分割して作成した部分要約です。
+これらを統合し、論文全体について以下の5つの観点から日本語で分析してください。各項目200～300文字で、
+専門用語には分かりやすい説明を併記し、数値データや比較結果は必ず含めてください。
+推測や憶測は避け、部分要約に記載された事実のみを記述してください。
+
+{format_section_guide()}
+
+【出力形式】
+次のJSONのみを出力してください（前後に説明文やコードブロックを付けないこと）。idは "p1" としてください。
+{format_json_schema()}
+
+【論文情報】
+{describe_paper(paper)}
+
+【部分要約】
+{partials}"""
+
+def summarize_map_reduce(paper, generate, map_reduce_config):
+    """
+    論文全文をmap-reduceで要約し、5つの観点のセクション辞書を返す
+
+    generate はプロバイダごとの生成関数で、generate(prompt, max_output_tokens, json_output)
+    の形で呼び出され生成テキストを返す。要約できなかった場合はNoneを返す。
+    """
+    chunk_chars = map_reduce_config.get('chunk_chars', 12000)
+    max_concurrency = map_reduce_config.get('max_concurrency', 4)
+    max_total_tokens = map_reduce_config.get('max_total_tokens', 60000)
+    map_output_tokens = map_reduce_config.get('map_output_tokens', 1024)
+    reduce_output_tokens = map_reduce_config.get('reduce_output_tokens', 4096)
+
+    text = extract_full_text(paper)
+    if not text.strip():
+        return None
+
+    chunks = limit_chunks(split_into_chunks(text, chunk_chars), max_total_tokens)
+    print_with_timestamp(f"map-reduce要約: {len(chunks)}チャンクを最大{max_concurrency}並列で要約します")
+
+    def summarize_chunk(args):
+        index, chunk = args
+        if is_expired():
+            print_with_timestamp(f"締め切りを過ぎたため、チャンク {index}/{len(chunks)} の要約を省略します")
+            return None
+        try:
+            return generate(build_map_prompt(paper, chunk, index, len(chunks)), map_output_tokens, False)
+        except Exception as e:
+            print_with_timestamp(f"チャンク {index}/{len(chunks)} の要約中にエラーが発生しました: {e}")
+            return None
+
+    # mapの結果はチャンクの順序を保ったまま受け取る
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        partial_summaries = [
+            summary for summary in executor.map(summarize_chunk, enumerate(chunks, 1))
+            if summary
+        ]
+
+    if not partial_summaries:
+        print_with_timestamp("部分要約を1件も生成できませんでした")
+        return None
+
+    try:
+        response_text = generate(build_reduce_prompt(paper, partial_summaries), reduce_output_tokens, True)
+        sections = parse_batch_response(response_text, {"p1"}).get("p1")
+    except Exception as e:
+        print_with_timestamp(f"部分要約の統合中にエラーが発生しました: {e}")
+        return None
+
+    if sections:
+        print_with_timestamp(f"map-reduce要約完了: {len(partial_summaries)}件の部分要約を統合しました")
+    return sections
@@ -0,0 +1,46 @@
+"""
+実行中の計測値を記録し、処理の最後にまとめて出力するモジュール
+"""
+import threading
+from .utils import print_with_timestamp
+
+# グローバル変数として計測値を保持（並列処理から更新されるためロックで保護する）
+metrics = {}
+metrics_lock = threading.Lock()
+
+def set_metric(name, value):
+    """計測値を設定する"""
+    with metrics_lock:
+        metrics[name] = value
+
+def increment_metric(name, amount=1):
+    """カウンタを加算する"""
+    with metrics_lock:
+        metrics[name] = metrics.get(name, 0) + amount
+
+def observe_metric(name, value):
+    """観測値（レイテンシなど）の件数・合計・最大値を記録する"""
+    with metrics_lock:
+        stats = metrics.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        stats['count'] += 1
+        stats['total'] += value
+        stats['max'] = max(stats['max'], value)
+
+def get_metrics():
+    with metrics_lock:
+        return dict(metrics)
+
+def format_metric(value):
+    if isinstance(value, dict) and 'count' in value:
+        average = value['total'] / value['count'] if value['count'] else 0.0
+        return f"count={value['count']} avg={average:.1f} max={value['max']:.1f}"
+    return value
+
+def report_metrics():
+    """記録された計測値をログに出力する"""
+    current = get_metrics()
+    if not current:
+        return
+    print_with_timestamp("実行メトリクス:")
+    for name in sorted(current):
+        print_with_timestamp(f"  {name}: {format_metric(current[name])}")
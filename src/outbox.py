@@ -0,0 +1,174 @@
+"""
+事前に整形したSlackメッセージを保存し、後から送信するための送信待ちキュー（SQLite）
+
+prepare で論文の取得・LLM処理・整形まで済ませたメッセージを保存し、send では
+保存済みのメッセージを取り出して送信するだけにする。メッセージは
+「プロファイル名:論文ID」を冪等キーとして1度だけ保存・送信する。
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from .config_loader import get_config
+
+# メッセージの状態
+#   pending: 送信待ち / sending: 送信中（送信済みの可能性があるため再送しない）
+#   sent: 送信済み / expired: 有効期限切れ
+#   unknown: 送信中のまま期限を過ぎた（送信されたかどうか不明のまま確定した）
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    profile TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS messages_pending
+    ON messages (profile, status, priority DESC, created_at);
+"""
+
+def get_outbox_config():
+    return get_config().get('outbox', {})
+
+def get_outbox_path():
+    """送信待ちキューのファイルパスを返す（相対パスはリポジトリのルートからのパス）"""
+    path = get_outbox_config().get('path', 'outbox.sqlite3')
+    if os.path.isabs(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+
+def connect():
+    """送信待ちキューに接続する（トランザクションは明示的に開始する）"""
+    connection = sqlite3.connect(get_outbox_path(), isolation_level=None, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+def make_idempotency_key(profile_name, paper_id):
+    return f"{profile_name}:{paper_id}"
+
+def enqueue(profile_name, paper_id, message, priority=0, ttl_hours=None):
+    """
+    メッセージを送信待ちキューに追加する
+
+    同じプロファイル・論文のメッセージが既にある場合（送信済みを含む）は追加せずFalseを返す。
+    """
+    if ttl_hours is None:
+        ttl_hours = get_outbox_config().get('ttl_hours', 72)
+    now = time.time()
+    expires_at = now + ttl_hours * 3600 if ttl_hours else None
+
+    with closing(connect()) as connection:
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO messages "
+            "(idempotency_key, profile, payload, priority, created_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (make_idempotency_key(profile_name, paper_id), profile_name,
+             json.dumps(message, ensure_ascii=False), priority, now, expires_at)
+        )
+        return cursor.rowcount == 1
+
+def expire_messages(retention_days=None):
+    """
+    期限を過ぎたメッセージを確定させ、(期限切れにした件数, 送信結果不明にした件数) を返す
+
+    送信待ちのメッセージは有効期限を過ぎたら expired にする。送信中のまま残った
+    メッセージは再送しないまま、有効期限（期限がない場合は保持期間）を過ぎたら unknown にする。
+    """
+    if retention_days is None:
+        retention_days = get_outbox_config().get('retention_days', 90)
+    now = time.time()
+    with closing(connect()) as connection:
+        expired = connection.execute(
+            "UPDATE messages SET status = 'expired' "
+            "WHERE status = 'pending' AND expires_at IS NOT NULL AND expires_at < ?",
+            (now,)
+        ).rowcount
+        abandoned = connection.execute(
+            "UPDATE messages SET status = 'unknown' "
+            "WHERE status = 'sending' AND COALESCE(expires_at, created_at + ?) < ?",
+            (retention_days * 86400, now)
+        ).rowcount
+        return expired, abandoned
+
+def claim_next(profile_name):
+    """
+    プロファイルの送信待ちのメッセージを優先度の高い順に1件取り出し、送信中にする
+
+    取り出したメッセージを (id, メッセージ) で返す。送信待ちがなければNoneを返す。
+    """
+    with closing(connect()) as connection:
+        # 複数のsendが同時に動いても同じメッセージを取り出さないよう書き込みロックを取る
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT id, payload FROM messages "
+                "WHERE profile = ? AND status = 'pending' AND (expires_at IS NULL OR expires_at >= ?) "
+                "ORDER BY priority DESC, created_at ASC LIMIT 1",
+                (profile_name, time.time())
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE messages SET status = 'sending', attempts = attempts + 1 WHERE id = ?",
+                (row['id'],)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+    return row['id'], json.loads(row['payload'])
+
+def mark_sent(message_id):
+    with closing(connect()) as connection:
+        connection.execute(
+            "UPDATE messages SET status = 'sent', sent_at = ? WHERE id = ?",
+            (time.time(), message_id)
+        )
+
+def release(message_id):
+    """送信できなかったメッセージを送信待ちに戻す"""
+    with closing(connect()) as connection:
+        connection.execute("UPDATE messages SET status = 'pending' WHERE id = ?", (message_id,))
+
+def count_stuck_messages(profile_name):
+    """送信中のまま残っているメッセージ数を返す（送信済みかどうか不明なため再送しない）"""
+    with closing(connect()) as connection:
+        row = connection.execute(
+            "SELECT COUNT(*) FROM messages WHERE profile = ? AND status = 'sending'",
+            (profile_name,)
+        ).fetchone()
+        return row[0]
+
+def count_pending(profile_name=None):
+    with closing(connect()) as connection:
+        if profile_name is None:
+            row = connection.execute("SELECT COUNT(*) FROM messages WHERE status = 'pending'").fetchone()
+        else:
+            row = connection.execute(
+                "SELECT COUNT(*) FROM messages WHERE profile = ? AND status = 'pending'",
+                (profile_name,)
+            ).fetchone()
+        return row[0]
+
+def prune_messages(retention_days=None):
+    """
+    保持期間を過ぎた送信済み・期限切れ・送信結果不明のメッセージを削除する
+
+    送信済みのメッセージは同じ論文を再送しないための冪等キーとして保持期間中は残す。
+    """
+    if retention_days is None:
+        retention_days = get_outbox_config().get('retention_days', 90)
+    with closing(connect()) as connection:
+        cursor = connection.execute(
+            "DELETE FROM messages WHERE status IN ('sent', 'expired', 'unknown') AND created_at < ?",
+            (time.time() - retention_days * 86400,)
+        )
+        return cursor.rowcount
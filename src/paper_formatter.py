@@ -3,15 +3,16 @@
 """
 from .config_loader import get_config
 from .utils import print_with_timestamp
+from .batch_summarizer import render_sections
 
 def clean_text(text):
     """テキストから不要な空白を削除します"""
     return ' '.join(text.split())
 
-def format_paper_for_slack(paper):
+def format_paper_for_slack(paper, llm_provider=None):
     """論文情報をSlack用のブロック形式にフォーマットします"""
-    config = get_config()
-    llm_provider = config.get('llm', {}).get('provider', 'none')
+    if llm_provider is None:
+        llm_provider = get_config().get('llm', {}).get('provider', 'none')
     
     try:
         title = clean_text(paper.title)
@@ -31,17 +32,37 @@ def format_paper_for_slack(paper):
         
         # LLM処理結果の追加
         llm_result = None
+        llm_sections = None
         llm_name = ""
         
         if llm_provider == "gemini":
             llm_result = getattr(paper, 'gemini_result', None)
+            llm_sections = getattr(paper, 'gemini_sections', None)
             llm_name = "Gemini"
         elif llm_provider == "chatgpt":
             llm_result = getattr(paper, 'chatgpt_result', None)
+            llm_sections = getattr(paper, 'chatgpt_sections', None)
             llm_name = "ChatGPT"
         
         # コンテンツブロックの追加
-        if llm_provider != "none" and llm_result:
+        if llm_provider != "none" and llm_sections:
+            # 構造化された要約の場合はセクションごとにブロックを分ける
+            blocks.append({
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*{llm_name}による要約:*"
+                }
+            })
+            for section_text in render_sections(llm_sections):
+                blocks.append({
+                    "type": "section",
+                    "text": {
+                        "type": "mrkdwn",
+                        "text": section_text
+                    }
+                })
+        elif llm_provider != "none" and llm_result:
             if llm_result.startswith("※"):
                 # LLMエラーの場合
                 blocks.extend([
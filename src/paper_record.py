@@ -0,0 +1,28 @@
+"""
+パイプラインで扱う論文情報を保持するコンパクトなレコード
+"""
+
+class PaperRecord:
+    """
+    arXivの検索結果から処理に必要なフィールドだけを取り出した論文レコード
+
+    大量の検索結果を候補として保持してもメモリを消費しないよう __slots__ を使う。
+    LLMの処理結果（*_result, *_sections）もこのレコードに格納する。
+    """
+    __slots__ = (
+        'entry_id', 'title', 'summary', 'authors', 'published', 'categories', 'pdf_url',
+        'gemini_result', 'gemini_sections', 'chatgpt_result', 'chatgpt_sections',
+    )
+
+    def __init__(self, entry_id, title, summary, authors, published, categories, pdf_url):
+        self.entry_id = entry_id
+        self.title = title
+        self.summary = summary
+        self.authors = authors  # 著者名（文字列）のタプル
+        self.published = published
+        self.categories = categories
+        self.pdf_url = pdf_url
+        self.gemini_result = None
+        self.gemini_sections = None
+        self.chatgpt_result = None
+        self.chatgpt_sections = None
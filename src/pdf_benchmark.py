@@ -0,0 +1,210 @@
+"""
+PDF抽出バックエンドのベンチマーク
+
+二段組みの論文を模したPDFをオフラインで生成し、バックエンドごとに
+抽出速度（ページ/秒）とセクション検出の成功率を計測する。
+--corpus で実際の論文PDFのディレクトリを指定した場合はそれも計測する
+（正解がないため、セクションが空でなく抽出できた割合を成功率とする）。
+
+使い方: python -m src.pdf_benchmark [--corpus DIR] [--repeat N]
+"""
+import argparse
+import os
+import random
+import time
+from .config_loader import load_config
+from .section_extractor import SECTION_KEYWORDS, extract_section
+from .pdf_extractors import EXTRACTORS, ExtractorUnavailableError, run_in_subprocess
+
+# 生成する論文のセクション（見出しの表記ゆれを含める）
+SAMPLE_DOCUMENTS = [
+    {"title": "Sample Paper A", "pages": 3, "headers": {
+        "introduction": "1 Introduction", "method": "2 Method",
+        "results": "3 Results", "conclusion": "4 Conclusion"}},
+    {"title": "Sample Paper B", "pages": 4, "headers": {
+        "introduction": "1. Introduction", "method": "2. Methodology",
+        "results": "3. Experiments", "conclusion": "4. Discussion"}},
+    {"title": "Sample Paper C", "pages": 5, "headers": {
+        "introduction": "Introduction", "method": "Approach",
+        "results": "Evaluation", "conclusion": "Conclusions"}},
+    {"title": "Sample Paper D", "pages": 6, "headers": {
+        "introduction": "1 INTRODUCTION", "method": "2 PROPOSED METHOD",
+        "results": "3 EXPERIMENTAL RESULTS", "conclusion": "4 CONCLUSION"}},
+]
+
+FILLER_WORDS = (
+    "model language training data retrieval attention layer token benchmark accuracy "
+    "baseline dataset evaluation transformer parameter inference latency objective loss "
+    "gradient sample prompt context alignment generation task performance improvement"
+).split()
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+COLUMN_X = (50, 316)
+TOP_Y, LEADING, LINES_PER_COLUMN, CHARS_PER_LINE = 740, 11, 60, 50
+
+def section_marker(name):
+    """セクション本文の1行目に埋め込み、抽出結果の正誤判定に使う文字列"""
+    return f"marker {name} body"
+
+def wrap_words(words, width):
+    lines, current = [], ""
+    for word in words:
+        if current and len(current) + len(word) + 1 > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+def build_document_lines(document, seed):
+    """1論文分のテキストを行のリストとして生成する"""
+    rng = random.Random(seed)
+    capacity = document["pages"] * 2 * LINES_PER_COLUMN
+    section_lines = capacity // 6
+
+    def filler(count):
+        return wrap_words([rng.choice(FILLER_WORDS) for _ in range(count * 8)], CHARS_PER_LINE)[:count]
+
+    lines = [document["title"], "", "Abstract"] + filler(6) + [""]
+    for name, header in document["headers"].items():
+        lines += [header, section_marker(name)] + filler(section_lines) + [""]
+    lines += ["References", "[1] A. Author. A referenced paper. 2024."]
+    return lines
+
+def escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def build_pdf(lines, pages):
+    """
+    行のリストを二段組みで配置した最小構成のPDFを生成する
+
+    実際の二段組みの論文と同様に、コンテンツストリームには左右の段の同じ高さの行を
+    交互に書き出す。ストリームの順に読むと左右の段の行が混ざるため、
+    レイアウト解析を行うバックエンドでなければ正しい読み順を復元できない。
+    """
+    per_page = 2 * LINES_PER_COLUMN
+    streams = []
+    for page in range(pages):
+        page_lines = lines[page * per_page:(page + 1) * per_page]
+        columns = [page_lines[:LINES_PER_COLUMN], page_lines[LINES_PER_COLUMN:]]
+        commands = ["BT /F1 9 Tf"]
+        for row in range(LINES_PER_COLUMN):
+            y = TOP_Y - row * LEADING
+            for x, column_lines in zip(COLUMN_X, columns):
+                if row < len(column_lines):
+                    commands.append(f"1 0 0 1 {x} {y} Tm ({escape_pdf_text(column_lines[row])}) Tj")
+        commands.append("ET")
+        streams.append("\n".join(commands).encode("latin-1"))
+
+    # オブジェクト番号: 1=カタログ, 2=ページツリー, 3=フォント, 4以降=ページとコンテンツ
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>".encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for page_id, stream in zip(page_ids, streams):
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode()
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+
+    pdf = b"%PDF-1.4\n"
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(pdf)
+        pdf += b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offsets[number] for number in sorted(objects))
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return pdf
+
+def build_sample_corpus():
+    """(名前, PDFのバイト列, 正解マーカーの辞書) のリストを返す"""
+    corpus = []
+    for seed, document in enumerate(SAMPLE_DOCUMENTS):
+        lines = build_document_lines(document, seed)
+        markers = {name: section_marker(name) for name in document["headers"]}
+        corpus.append((document["title"], build_pdf(lines, document["pages"]), markers))
+    return corpus
+
+def load_corpus_directory(directory):
+    """ディレクトリ内のPDFを (名前, PDFのバイト列, None) のリストとして読み込む"""
+    corpus = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.lower().endswith(".pdf"):
+            with open(os.path.join(directory, filename), "rb") as f:
+                corpus.append((filename, f.read(), None))
+    return corpus
+
+def count_section_hits(text, markers):
+    """検出できたセクション数を返す（正解がない場合は空でないセクションを数える）"""
+    hits = 0
+    for name, keywords in SECTION_KEYWORDS.items():
+        section = extract_section(text, keywords)
+        if markers is None:
+            hits += bool(section)
+        elif name in markers and markers[name] in section:
+            hits += 1
+    return hits
+
+def time_extraction(name, pdf_bytes, repeat):
+    """抽出をrepeat回繰り返し、(ページごとのテキストのリスト, 経過秒数) を返す"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pages, _ = EXTRACTORS[name](pdf_bytes, False)
+    return pages, time.perf_counter() - start
+
+def benchmark_backend(name, corpus, repeat, timeout):
+    """1つのバックエンドでコーパス全体を処理し、計測結果を辞書で返す"""
+    total_pages = 0
+    elapsed = 0.0
+    hits = 0
+    errors = 0
+    for _, pdf_bytes, markers in corpus:
+        try:
+            # 本番と同様に子プロセスで実行する（計測時間にプロセスの起動時間は含めない）
+            pages, seconds = run_in_subprocess(time_extraction, (name, pdf_bytes, repeat), timeout * repeat)
+            elapsed += seconds
+            total_pages += len(pages) * repeat
+            hits += count_section_hits("\n".join(pages), markers)
+        except ExtractorUnavailableError:
+            raise
+        except Exception:
+            errors += 1
+    return {
+        "pages_per_sec": total_pages / elapsed if elapsed else 0.0,
+        "hit_rate": hits / (len(corpus) * len(SECTION_KEYWORDS)),
+        "errors": errors,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF抽出バックエンドのベンチマーク")
+    parser.add_argument("--corpus", help="追加で計測する論文PDFのディレクトリ")
+    parser.add_argument("--repeat", type=int, default=3, help="速度計測の繰り返し回数")
+    parser.add_argument("--timeout", type=float, default=60, help="1回の抽出のタイムアウト秒数")
+    args = parser.parse_args()
+
+    load_config()
+    corpora = [("sample", build_sample_corpus())]
+    if args.corpus:
+        corpora.append((args.corpus, load_corpus_directory(args.corpus)))
+
+    for corpus_name, corpus in corpora:
+        print(f"コーパス: {corpus_name}（{len(corpus)}件）")
+        print(f"{'backend':<10} {'pages/sec':>10} {'section hit rate':>17} {'errors':>7}")
+        for name in EXTRACTORS:
+            try:
+                result = benchmark_backend(name, corpus, args.repeat, args.timeout)
+            except ExtractorUnavailableError as e:
+                print(f"{name:<10} 利用できません（{e}）")
+                continue
+            print(f"{name:<10} {result['pages_per_sec']:>10.1f} {result['hit_rate']:>17.0%} {result['errors']:>7}")
+        print()
+
+if __name__ == "__main__":
+    main()
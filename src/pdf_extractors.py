@@ -0,0 +1,262 @@
+"""
+PDFからのテキスト抽出を複数のバックエンドで行うモジュール
+
+バックエンドは設定の pdf.backends の順に試し、利用できない・失敗した・
+タイムアウトした場合は次のバックエンドにフォールバックする。
+"""
+import multiprocessing
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from io import BytesIO
+from .config_loader import get_config
+from .deadline import stage_timeout, is_expired
+from .utils import print_with_timestamp
+from . import http_client
+
+DEFAULT_BACKENDS = ["pdftotext", "pdfminer", "pypdf"]
+DEFAULT_TIMEOUT = 30
+
+# 論文IDごとのPDFと抽出結果のキャッシュ（1回の実行の間だけ保持する）
+pdf_cache = {}
+cache_lock = threading.Lock()
+
+class ExtractorUnavailableError(Exception):
+    """バックエンドに必要なライブラリやコマンドがインストールされていないことを表す"""
+
+class ExtractorTimeoutError(Exception):
+    """バックエンドの抽出がタイムアウトしたことを表す"""
+
+def extract_pages_pypdf(pdf_bytes, first_last_only=False):
+    """pypdf（未インストールの場合はPyPDF2）でページごとのテキストを抽出する"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        try:
+            from PyPDF2 import PdfReader
+        except ImportError:
+            raise ExtractorUnavailableError("pypdf / PyPDF2 がインストールされていません")
+
+    pdf_reader = PdfReader(BytesIO(pdf_bytes))
+    total_pages = len(pdf_reader.pages)
+    if first_last_only:
+        indices = [0, total_pages - 1] if total_pages > 1 else list(range(total_pages))
+    else:
+        indices = range(total_pages)
+
+    # 締め切りを過ぎた場合はそこまでのページで打ち切る
+    pages = []
+    for i in indices:
+        if is_expired():
+            print_with_timestamp(f"締め切りを過ぎたため、{len(pages)}ページ目までで抽出を打ち切ります")
+            break
+        pages.append(pdf_reader.pages[i].extract_text() or "")
+    return pages, total_pages
+
+def count_pages_pdfminer(pdf_bytes):
+    """pdfminer.sixでページのレイアウト解析をせずに総ページ数を取得する"""
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdftypes import resolve1
+
+    document = PDFDocument(PDFParser(BytesIO(pdf_bytes)))
+    return resolve1(document.catalog['Pages'])['Count']
+
+def extract_pages_pdfminer(pdf_bytes, first_last_only=False):
+    """pdfminer.sixでページごとのテキストを抽出する（段組みのレイアウト解析を行う）"""
+    try:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+    except ImportError:
+        raise ExtractorUnavailableError("pdfminer.six がインストールされていません")
+
+    # 最初と最後のページのみの場合は、その2ページだけをレイアウト解析する
+    page_numbers = None
+    total_pages = None
+    if first_last_only:
+        total_pages = count_pages_pdfminer(pdf_bytes)
+        page_numbers = {0, max(total_pages - 1, 0)}
+
+    pages = []
+    for layout in extract_pages(BytesIO(pdf_bytes), page_numbers=page_numbers):
+        if is_expired():
+            print_with_timestamp(f"締め切りを過ぎたため、{len(pages)}ページ目までで抽出を打ち切ります")
+            break
+        pages.append("".join(element.get_text() for element in layout if isinstance(element, LTTextContainer)))
+    return pages, total_pages if total_pages is not None else len(pages)
+
+def run_poppler(command, args, timeout, pdf_bytes=None):
+    """popplerのコマンドを実行し、標準出力の文字列を返す"""
+    result = subprocess.run(
+        [command] + args,
+        input=pdf_bytes,
+        capture_output=True,
+        timeout=timeout,
+        check=True
+    )
+    return result.stdout.decode("utf-8", errors="replace")
+
+def extract_pages_pdftotext(pdf_bytes, first_last_only=False, timeout=DEFAULT_TIMEOUT):
+    """popplerのpdftotextコマンドでページごとのテキストを抽出する"""
+    command = shutil.which("pdftotext")
+    if not command:
+        raise ExtractorUnavailableError("pdftotext コマンドが見つかりません")
+
+    pdfinfo = shutil.which("pdfinfo")
+    if first_last_only and pdfinfo:
+        return extract_first_and_last_pages_pdftotext(command, pdfinfo, pdf_bytes, timeout)
+
+    # 標準入力からPDFを読み、標準出力にテキストを書き出す（ページは改ページ文字で区切られる）
+    pages = run_poppler(command, ["-enc", "UTF-8", "-", "-"], timeout, pdf_bytes).split("\f")
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return select_pages(pages, first_last_only), len(pages)
+
+def extract_first_and_last_pages_pdftotext(command, pdfinfo, pdf_bytes, timeout):
+    """pdfinfoで総ページ数を取得し、pdftotextで最初と最後のページのみを抽出する"""
+    end_time = time.monotonic() + timeout
+
+    def remaining():
+        return max(end_time - time.monotonic(), 0.1)
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+        pdf_file.write(pdf_bytes)
+        pdf_file.flush()
+
+        info = run_poppler(pdfinfo, [pdf_file.name], remaining())
+        match = re.search(r"^Pages:\s+(\d+)", info, re.MULTILINE)
+        if not match:
+            raise ValueError("pdfinfo の出力からページ数を取得できませんでした")
+        total_pages = int(match.group(1))
+
+        pages = []
+        for page in sorted({1, max(total_pages, 1)}):
+            text = run_poppler(command, ["-enc", "UTF-8", "-f", str(page), "-l", str(page), pdf_file.name, "-"], remaining())
+            pages.append(text.rstrip("\f"))
+    return pages, total_pages
+
+def select_pages(pages, first_last_only):
+    """first_last_onlyの場合は最初と最後のページのみを返す"""
+    if first_last_only and len(pages) > 2:
+        return [pages[0], pages[-1]]
+    return pages
+
+# バックエンド名と抽出関数の対応
+EXTRACTORS = {
+    "pypdf": extract_pages_pypdf,
+    "pdfminer": extract_pages_pdfminer,
+    "pdftotext": extract_pages_pdftotext,
+}
+
+def run_in_process(func, args, connection):
+    """子プロセスで関数を実行し、(成否, 結果または例外) を親プロセスに送る"""
+    try:
+        result = (True, func(*args))
+    except Exception as e:
+        result = (False, e)
+    try:
+        connection.send(result)
+    except Exception:
+        # pickleできない例外などで送れない場合は内容を文字列にして送る
+        connection.send((False, RuntimeError(str(result[1]))))
+    finally:
+        connection.close()
+
+def run_in_subprocess(func, args, timeout):
+    """
+    関数を子プロセスで実行し、タイムアウトした場合はプロセスを停止する
+
+    スレッドと異なりタイムアウト後に処理が裏で動き続けないため、
+    フォールバック先のバックエンドや締め切りに影響しない。
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_in_process, args=(func, args, sender), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise ExtractorTimeoutError(f"{timeout:.0f}秒以内に抽出が終わりませんでした")
+        success, value = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f"抽出プロセスが異常終了しました（終了コード: {process.exitcode}）")
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        receiver.close()
+    if not success:
+        raise value
+    return value
+
+def run_with_timeout(name, pdf_bytes, first_last_only, timeout):
+    """バックエンドをタイムアウト付きで実行する"""
+    if name == "pdftotext":
+        # 外部コマンドはsubprocessのタイムアウトで確実に停止させる
+        return extract_pages_pdftotext(pdf_bytes, first_last_only, timeout=timeout)
+
+    # Pythonのバックエンドは子プロセスで実行し、タイムアウトしたらプロセスごと停止する
+    return run_in_subprocess(EXTRACTORS[name], (pdf_bytes, first_last_only), timeout)
+
+def extract_pages(pdf_bytes, first_last_only=False, backends=None):
+    """
+    設定されたバックエンドを順に試し、(ページごとのテキストのリスト, 総ページ数) を返す
+
+    backendsを省略した場合は設定の pdf.backends を使う。
+    すべてのバックエンドが失敗した場合は最後のエラーを送出する。
+    """
+    pdf_config = get_config().get('pdf', {})
+    if backends is None:
+        backends = pdf_config.get('backends', DEFAULT_BACKENDS)
+    timeouts = pdf_config.get('timeouts', {})
+
+    last_error = ExtractorUnavailableError("利用できるPDF抽出バックエンドがありません")
+    for name in backends:
+        if name not in EXTRACTORS:
+            print_with_timestamp(f"不明なPDF抽出バックエンドです: {name}")
+            continue
+        timeout = stage_timeout(timeouts.get(name, DEFAULT_TIMEOUT))
+        try:
+            pages, total_pages = run_with_timeout(name, pdf_bytes, first_last_only, timeout)
+            print_with_timestamp(f"PDF抽出バックエンド {name} でテキストを抽出しました")
+            return pages, total_pages
+        except ExtractorUnavailableError as e:
+            last_error = e
+        except (ExtractorTimeoutError, subprocess.TimeoutExpired) as e:
+            print_with_timestamp(f"PDF抽出バックエンド {name} が{timeout:.0f}秒でタイムアウトしました")
+            last_error = e
+        except Exception as e:
+            print_with_timestamp(f"PDF抽出バックエンド {name} でエラーが発生しました: {e}")
+            last_error = e
+    raise last_error
+
+def fetch_pdf_pages(paper, first_last_only=False):
+    """
+    論文のPDFをダウンロードし、(ページごとのテキストのリスト, 総ページ数) を返す
+
+    複数のプロファイル・LLM設定で同じ論文を処理してもダウンロードと抽出が
+    1回で済むよう、結果を論文IDごとにキャッシュする。
+    """
+    with cache_lock:
+        entry = pdf_cache.setdefault(paper.entry_id, {})
+        if first_last_only in entry:
+            return entry[first_last_only]
+        if False in entry:
+            # 全ページの抽出結果があれば、そこから最初と最後のページを取り出す
+            pages, total_pages = entry[False]
+            return select_pages(pages, first_last_only), total_pages
+        pdf_bytes = entry.get('pdf')
+
+    if pdf_bytes is None:
+        response = http_client.get(paper.pdf_url, timeout=30)
+        response.raise_for_status()
+        pdf_bytes = response.content
+        with cache_lock:
+            entry['pdf'] = pdf_bytes
+
+    result = extract_pages(pdf_bytes, first_last_only)
+    with cache_lock:
+        entry[first_last_only] = result
+    return result
@@ -0,0 +1,103 @@
+"""
+複数プロファイル分の論文取得・LLM処理・フォーマットをまとめて行うモジュール
+"""
+import copy
+import json
+from .arxiv_client import select_papers_for_profiles
+from .gemini_processor import process_papers_with_gemini_batch, process_paper_with_gemini_map_reduce
+from .chatgpt_processor import process_paper_with_chatgpt, process_paper_with_chatgpt_map_reduce
+from .paper_formatter import format_paper_for_slack
+from .slack_sender import add_greeting_to_message
+from .config_loader import get_config
+from .deadline import choose_degradation_level
+from .utils import print_with_timestamp
+
+def get_llm_key(profile):
+    """LLMの処理結果を共有できるかを判定するためのキー（プロバイダとその設定）"""
+    provider = profile['llm'].get('provider', 'none')
+    if provider not in ('gemini', 'chatgpt'):
+        return provider, ""
+    settings = {'llm': profile['llm'], provider: profile.get(provider, {})}
+    return provider, json.dumps(settings, sort_keys=True, default=str)
+
+def process_papers_for_profiles(profiles, selected):
+    """
+    選択された論文をLLMで処理し、プロファイル名をキーとする辞書で返す
+
+    同じ論文を同じLLM設定で選んだプロファイル同士は処理結果を共有するため、
+    LLMの呼び出し回数はプロファイル数ではなくユニークな論文数に比例する。
+    締め切りまでの残り時間が少ない場合は、より軽い処理に切り替える。
+    """
+    thresholds = get_config().get('runtime', {}).get('degradation', {})
+
+    # LLM設定ごとに、処理が必要なユニークな論文をまとめる
+    # 異なるLLM設定で同じ論文を処理する場合は、処理前にコピーを作って結果が混ざらないようにする
+    groups = {}
+    seen = set()
+    for profile in profiles:
+        paper = selected.get(profile['name'])
+        if paper is None:
+            continue
+        group = groups.setdefault(get_llm_key(profile), {'profile': profile, 'papers': {}})
+        if paper.entry_id not in group['papers']:
+            group['papers'][paper.entry_id] = copy.copy(paper) if paper.entry_id in seen else paper
+            seen.add(paper.entry_id)
+
+    processed = {}
+    for key, group in groups.items():
+        provider = key[0]
+        profile = group['profile']
+        papers = list(group['papers'].values())
+
+        level = choose_degradation_level(thresholds) if provider in ('gemini', 'chatgpt') else "full"
+        use_map_reduce = profile['llm'].get('map_reduce', {}).get('enabled', False) and level == "full"
+        map_reduce_config = profile['llm'].get('map_reduce', {})
+        print_with_timestamp(f"LLMプロバイダ {provider} で {len(papers)} 件のユニークな論文を処理します（処理レベル: {level}）")
+        if level == "no_llm":
+            print_with_timestamp("締め切りまでの残り時間が少ないため、LLMを使用せずアブストラクトを投稿します")
+        elif provider == "gemini" and use_map_reduce:
+            for paper in papers:
+                process_paper_with_gemini_map_reduce(paper, map_reduce_config, settings=profile['gemini'])
+        elif provider == "chatgpt" and use_map_reduce:
+            for paper in papers:
+                process_paper_with_chatgpt_map_reduce(paper, map_reduce_config, settings=profile['chatgpt'])
+        elif provider == "gemini":
+            process_papers_with_gemini_batch(papers, settings=profile['gemini'], degradation_level=level)
+        elif provider == "chatgpt":
+            for paper in papers:
+                process_paper_with_chatgpt(paper, settings=profile['chatgpt'], degradation_level=level)
+        else:
+            print_with_timestamp("LLMは使用しません")
+
+        for paper in papers:
+            processed[(key, paper.entry_id)] = paper
+
+    return {
+        profile['name']: processed[(get_llm_key(profile), selected[profile['name']].entry_id)]
+        for profile in profiles
+        if selected.get(profile['name']) is not None
+    }
+
+def build_messages_for_profiles(profiles):
+    """
+    全プロファイル分のSlackメッセージを構築する
+
+    返り値は (プロファイル, 論文, メッセージ) のリスト。論文の取得やフォーマットに
+    失敗したプロファイルは含まれない。
+    """
+    selected = select_papers_for_profiles(profiles)
+    papers = process_papers_for_profiles(profiles, selected)
+
+    messages = []
+    for profile in profiles:
+        paper = papers.get(profile['name'])
+        if paper is None:
+            continue
+
+        message = format_paper_for_slack(paper, llm_provider=profile['llm'].get('provider', 'none'))
+        if not message:
+            print_with_timestamp(f"プロファイル {profile['name']} のメッセージのフォーマットに失敗しました。")
+            continue
+        messages.append((profile, paper, add_greeting_to_message(message)))
+
+    return messages
@@ -0,0 +1,30 @@
+"""
+PDFから抽出したテキストから論文のセクションを検出するモジュール
+
+LLMのライブラリに依存しないため、PDF抽出のベンチマークからも利用できる。
+"""
+import re
+
+# 抽出するセクションと、その見出しとみなすキーワード
+SECTION_KEYWORDS = {
+    'introduction': ['introduction', '1.', 'はじめに', '序論'],
+    'method': ['method', 'approach', '手法', '方法', 'methodology'],
+    'results': ['result', 'experiment', '実験', '結果', 'evaluation'],
+    'conclusion': ['conclusion', 'discussion', '結論', '考察', 'まとめ'],
+}
+
+def extract_section(text, keywords):
+    """特定のセクションをキーワードベースで抽出"""
+    text_lower = text.lower()
+    
+    for keyword in keywords:
+        # セクションヘッダーを探す
+        pattern = rf'(?:^|\n)\s*(?:\d+\.?\s*)?{re.escape(keyword.lower())}.*?\n(.*?)(?=\n\s*(?:\d+\.?\s*)?[a-zA-Z]|$)'
+        match = re.search(pattern, text_lower, re.DOTALL | re.IGNORECASE)
+        
+        if match:
+            section_text = match.group(1).strip()
+            # 最初の500文字程度を返す
+            return section_text[:500] if section_text else ""
+    
+    return ""
@@ -0,0 +1,48 @@
+"""
+検索結果を全件保持せずに候補を選択するための選択器
+"""
+import heapq
+import random
+
+class ReservoirSampler:
+    """リザーバサンプリングで、これまでに追加された要素から一様にk件を選ぶ"""
+    __slots__ = ('k', 'seen', 'items')
+
+    def __init__(self, k=1):
+        self.k = k
+        self.seen = 0
+        self.items = []
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.k:
+            self.items.append(item)
+        else:
+            index = random.randrange(self.seen)
+            if index < self.k:
+                self.items[index] = item
+
+    def result(self):
+        return list(self.items)
+
+class TopKSelector:
+    """スコアの高い上位k件をヒープで保持する（同点の場合は先に追加された要素を優先）"""
+    __slots__ = ('k', 'score', 'seen', 'heap')
+
+    def __init__(self, k, score):
+        self.k = k
+        self.score = score
+        self.seen = 0
+        self.heap = []
+
+    def add(self, item):
+        self.seen += 1
+        # 順序の逆数をタイブレークに使い、要素同士の比較を避ける
+        entry = (self.score(item), -self.seen, item)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def result(self):
+        return [item for _, _, item in sorted(self.heap, key=lambda entry: entry[:2], reverse=True)]
@@ -2,21 +2,43 @@
 Slackへのメッセージ送信を扱うモジュール
 """
 import os
-from slack_sdk.webhook import WebhookClient
-from slack_sdk.errors import SlackApiError
 from .config_loader import get_config
 from .utils import print_with_timestamp
+from . import http_client
 
-def send_to_slack(message):
-    """Slackにメッセージを送信します"""
+# send_to_slack の送信結果
+SEND_OK = "sent"  # 送信済み
+SEND_SKIPPED = "skipped"  # テストモードのため送信していない
+SEND_FAILED = "failed"  # 送信されていないことが確実な失敗（接続拒否、4xxなど）
+SEND_UNKNOWN = "unknown"  # 送信されたかどうか不明な失敗（タイムアウト、5xxなど）
+
+def classify_failure(error=None, status_code=None):
+    """送信の失敗が、送信されていないことが確実なものかどうかを判定する"""
+    if error is not None:
+        if isinstance(error, http_client.CircuitOpenError) or http_client.is_connection_failure(error):
+            return SEND_FAILED
+        status_code = http_client.get_status_code(error)
+    # 4xx（レート制限の429を含む）の場合、Slackはメッセージを投稿していない
+    if status_code is not None and 400 <= status_code < 500:
+        return SEND_FAILED
+    return SEND_UNKNOWN
+
+def send_to_slack(message, slack_config=None):
+    """
+    Slackにメッセージを送信し、送信結果（SEND_OK などの定数）を返します
+    （slack_configを省略した場合は設定ファイルのslackセクションを使用）
+
+    同じメッセージの二重投稿を避けるため、送信はリトライしない。
+    """
     # メッセージの事前チェック
     if not message:
         print_with_timestamp("送信するメッセージが空です。処理を中止します。")
-        return None
+        return SEND_FAILED
     
-    config = get_config()
-    webhook_env_var = config.get('slack', {}).get('webhook_url_env', 'SLACK_WEBHOOKS')
-    test_mode = config.get('slack', {}).get('test_mode', False)
+    if slack_config is None:
+        slack_config = get_config().get('slack', {})
+    webhook_env_var = slack_config.get('webhook_url_env', 'SLACK_WEBHOOKS')
+    test_mode = slack_config.get('test_mode', False)
     
     # 環境変数のデバッグ情報を表示
     print_with_timestamp(f"Slack webhook環境変数名: {webhook_env_var}")
@@ -31,33 +53,32 @@ def send_to_slack(message):
             print_with_timestamp(f"環境変数 {env_var} は設定されていません")
     
     webhook_url = os.environ.get(webhook_env_var)
+    if not webhook_url:
+        print_with_timestamp(f"Slack webhook URLが環境変数 {webhook_env_var} に設定されていません。GitHubリポジトリのSecretsを確認してください。")
+        return SEND_FAILED
+    
+    # テストモードの場合は実際に送信せず、メッセージを表示するのみ
+    if test_mode:
+        print_with_timestamp("テストモードが有効なため、Slackへの実際の送信をスキップします。")
+        print_with_timestamp("送信予定のメッセージ内容:")
+        if message and isinstance(message, dict) and "blocks" in message:
+            for block in message["blocks"]:
+                if block.get("type") == "section" and "text" in block:
+                    text_content = block["text"].get("text", "")
+                    print_with_timestamp(f"- {text_content[:100]}..." if len(text_content) > 100 else f"- {text_content}")
+        return SEND_SKIPPED
     
     try:
-        if not webhook_url:
-            print_with_timestamp(f"Slack webhook URLが環境変数 {webhook_env_var} に設定されていません。GitHubリポジトリのSecretsを確認してください。")
-            return None
-        
-        # テストモードの場合は実際に送信せず、メッセージを表示するのみ
-        if test_mode:
-            print_with_timestamp("テストモードが有効なため、Slackへの実際の送信をスキップします。")
-            print_with_timestamp("送信予定のメッセージ内容:")
-            if message and isinstance(message, dict) and "blocks" in message:
-                for block in message["blocks"]:
-                    if block.get("type") == "section" and "text" in block:
-                        text_content = block["text"].get("text", "")
-                        print_with_timestamp(f"- {text_content[:100]}..." if len(text_content) > 100 else f"- {text_content}")
-            return None
-            
-        webhook = WebhookClient(webhook_url)
-        response = webhook.send(**message)
-        print_with_timestamp(f"Slackへの送信が完了しました。ステータスコード: {response.status_code}")
-        return response
-    except SlackApiError as e:
-        print_with_timestamp(f"Slackへの送信中にAPIエラーが発生しました: {e}")
-        return None
+        response = http_client.post(webhook_url, json=message, timeout=30, retry=False)
     except Exception as e:
         print_with_timestamp(f"Slackへの送信中に予期しないエラーが発生しました: {e}")
-        return None
+        return classify_failure(error=e)
+    
+    if response.status_code != 200:
+        print_with_timestamp(f"Slackへの送信中にAPIエラーが発生しました: {response.status_code} {response.text}")
+        return classify_failure(status_code=response.status_code)
+    print_with_timestamp(f"Slackへの送信が完了しました。ステータスコード: {response.status_code}")
+    return SEND_OK
         
 def add_greeting_to_message(message):
     """メッセージにあいさつを追加する"""